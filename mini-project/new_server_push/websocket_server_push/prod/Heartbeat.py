@@ -7,6 +7,9 @@ import json
 import urllib2, httplib
 import threading
 import datetime
+import Queue
+from collections import OrderedDict
+import http_pool
 from daemon import Daemon
 from common_error import *
 import DevClient
@@ -28,8 +31,9 @@ import ctypes
 libc = ctypes.cdll.LoadLibrary('libc.so.6')
 res_init = libc.__res_init
 
-mapping_heartbeat_module_name = {}
-mapping_heartbeat_name_module = {}
+from plugin_registry import PluginRegistry, PluginUnavailable
+import liveness
+heartbeat_plugins = PluginRegistry(os.path.dirname(os.path.realpath(__file__)) + '/heartbeat_handler')
 #mapping_persistent_name_module = {}
 #mapping_persistent_module_name = {}
 
@@ -42,34 +46,42 @@ def refresh_dns():
     except Exception, e:
         logging.error(traceback.format_exc())
 
+# liveness marker for the watchdog, read it with liveness.read()/age() or `python liveness.py`
+LIVENESS_PATH = liveness.DEFAULT_PATH
+LIVENESS_FSYNC_INTERVAL = None  # seconds between msync, None leaves write back to the kernel
+liveness_marker = []
+# the old utcnow() text file is still written for watchdogs that read it, at most once per
+# HEARTBEAT_TXT_INTERVAL seconds, so it can be that much older than the last beat; None stops it
+HEARTBEAT_TXT_PATH = '/usr/vtm/tmp/heartbeat.txt'
+HEARTBEAT_TXT_INTERVAL = 60
+heartbeat_txt_written = [0]
+
 def SetLastHeartTime():
-    fileName = "/usr/vtm/tmp/heartbeat.txt";
+    now = time.time()
+    try:
+        if not liveness_marker:
+            liveness_marker.append(liveness.LivenessMarker(LIVENESS_PATH, LIVENESS_FSYNC_INTERVAL))
+        liveness_marker[0].beat(now)
+    except Exception, e:
+        logging.error(traceback.format_exc())
+    if HEARTBEAT_TXT_INTERVAL is None or now - heartbeat_txt_written[0] < HEARTBEAT_TXT_INTERVAL:
+        return
+    heartbeat_txt_written[0] = now
     try:
-        infile = open(fileName, 'wb')
-        dt = datetime.datetime.utcnow()
-        infile.write(str(dt))
-        infile.close()
-    except:
-        print "except"
-        pass
+        infile = open(HEARTBEAT_TXT_PATH, 'wb')
+        try:
+            infile.write(str(datetime.datetime.utcfromtimestamp(now)))
+        finally:
+            infile.close()
+    except Exception, e:
+        logging.error(traceback.format_exc())
+
 import itertools
 def anyTrue(predicate, sequence):
     return True in itertools.imap(predicate, sequence)
 def endsWith(s, *endings):
     return anyTrue(s.endswith, endings)
 
-for filename in os.listdir(os.path.dirname(os.path.realpath(__file__)) + '/heartbeat_handler'):
-    if endsWith(filename, '.py'):
-        pluginname = filename.replace('.py', '')
-        try:
-            module = __import__(pluginname)
-            mapping_heartbeat_module_name[module] = pluginname
-            mapping_heartbeat_name_module[pluginname] = module
-            #heartbeat_plugin_module.append(module)
-
-        except Exception, e:
-            logging.error(traceback.format_exc())
-            continue
 """
 for filename in os.listdir(os.path.dirname(os.path.realpath(__file__)) + '/persistent_handler'):
     if endsWith(filename, '.py'):
@@ -96,14 +108,17 @@ class Heartbeat(threading.Thread):
             #add ETH0's mac to heartbeat by jim
             serial_number_mac = None
             request_dict = {}
-            for key in mapping_heartbeat_module_name:
-                tmp = key.get_api_request()
+            for name in heartbeat_plugins.names():
+                try:
+                    tmp = heartbeat_plugins.call(name, 'get_api_request')
+                except PluginUnavailable:
+                    continue
                 if not tmp == None:
                     for item in tmp:
                         if item['api'] == 'guid_check':
                             serial_number_mac = item['param']
 
-                request_dict[mapping_heartbeat_module_name[key]] = tmp
+                request_dict[name] = tmp
 
             logging.debug("request_dict %r",request_dict)
 
@@ -132,9 +147,11 @@ class Heartbeat(threading.Thread):
                     logging.info('[Heartbeat thread]connection request to skynet failed, maybe newwork error now')
                     logging.info('[Heartbeat thread]run offline callback')
 
-                    for key in mapping_heartbeat_module_name:
+                    for name in heartbeat_plugins.names():
                         try:
-                            key.offline_handler()
+                            heartbeat_plugins.call(name, 'offline_handler')
+                        except PluginUnavailable:
+                            continue
                         except Exception, e:
                             logging.error(traceback.format_exc())
                             logging.error('[Heartbeat thread]call offline_handler error')
@@ -153,13 +170,14 @@ class Heartbeat(threading.Thread):
 
             for key in resp_dict:
                 try:
-                    mapping_heartbeat_name_module[key].resp_handler(resp_dict[key])
+                    heartbeat_plugins.call(key, 'resp_handler', resp_dict[key])
                 except Exception, e:
                     logging.error(traceback.format_exc())
                     logging.error('[Heartbeat thread]call resp_handler failed')
                     continue
 
             logging.debug('[Heartbeat thread]get success from skynet heartbeat api, sleep %s second', DevClient.HEARTBEAT_INTERVAL)
+            logging.debug('[Heartbeat thread]plugin timings %r', heartbeat_plugins.timing_report())
             #write heart beat time
             SetLastHeartTime()
 
@@ -167,15 +185,60 @@ class Heartbeat(threading.Thread):
             sleep_time = DevClient.HEARTBEAT_INTERVAL - (start_sleep - self.heartbeat_begin)% DevClient.HEARTBEAT_INTERVAL
             time.sleep(sleep_time)
 
-class LongPollingRespHandler(threading.Thread):
-    def __init__(self, guid, instance_ip, prefix_id, callback, param, cookie=None):
-        threading.Thread.__init__(self)
+CMD_WORKERS = 4               # threads running commands
+CMD_QUEUE_SIZE = 32           # commands waiting for a worker, more are dropped
+CMD_DEDUPE_SECONDS = 60       # the same prefix_id within this window is run only once
+RESULT_RETRY_DELAY = 0.25     # first retry delay when publishing a result, doubled each time
+# sent with record_instance_ip: this device answers on the resp_channel named in a cmd,
+# push_cmd only uses the shared response channel for devices that sent it
+HEADER_RESP_CHANNEL = 'X-Resp-Channel'
+
+class CommandPool(object):
+    def __init__(self, workers=CMD_WORKERS, queue_size=CMD_QUEUE_SIZE, dedupe_seconds=CMD_DEDUPE_SECONDS):
+        self.queue = Queue.Queue(queue_size)
+        self.dedupe_seconds = dedupe_seconds
+        self.seen = OrderedDict()   # prefix_id -> time received, oldest first
+        self.lock = threading.Lock()
+        for i in range(workers):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, handler):
+        now = time.time()
+        with self.lock:
+            while self.seen and now - self.seen[next(iter(self.seen))] > self.dedupe_seconds:
+                self.seen.popitem(last=False)
+            if handler.prefix_id in self.seen:
+                logging.info('[Websocket thread]get same cmd twice, skip prefix_id %s', handler.prefix_id)
+                return False
+            self.seen[handler.prefix_id] = now
+        try:
+            self.queue.put_nowait(handler)
+        except Queue.Full:
+            logging.error('[Websocket thread]command queue is full, drop cmd %s, prefix_id %s', handler.callback, handler.prefix_id)
+            with self.lock:
+                self.seen.pop(handler.prefix_id, None)  # let a resend of this command through
+            return False
+        return True
+
+    def work(self):
+        while 1:
+            handler = self.queue.get()
+            try:
+                handler.run()
+            except Exception, e:
+                logging.error(traceback.format_exc())
+
+class LongPollingRespHandler(object):
+    def __init__(self, guid, instance_ip, prefix_id, callback, param, cookie=None, resp_channel=None):
         self.guid = guid
         self.instance_ip = instance_ip
         self.prefix_id = prefix_id
         self.callback = callback
         self.param = param
         self.cookie = cookie
+        self.resp_channel = resp_channel
 
     def run(self):
         #result = mapping_persistent_name_module[self.callback].resp_handler(self.param)
@@ -203,36 +266,43 @@ class LongPollingRespHandler(threading.Thread):
 
         logging.debug(str(result))
 
-        url_string = 'https://' + DevClient.push_server + '/broadcast/pub?channel=' + self.guid + self.prefix_id
+        if self.resp_channel:
+            # the server waits on one shared channel and matches the response by prefix_id
+            url_string = 'https://' + DevClient.push_server + '/broadcast/pub?channel=' + self.resp_channel
+            result = {'prefix_id' : self.prefix_id, 'response' : result}
+        else:
+            url_string = 'https://' + DevClient.push_server + '/broadcast/pub?channel=' + self.guid + self.prefix_id
         logging.debug(url_string)
 
+        headers = {}
+        if self.cookie:
+            logging.debug('[LongPollingRespHandler thread]add cookie to http header')
+            headers['cookie'] = self.cookie
+        proxy = getattr(DevClient.proxy_handler, 'proxies', {}).get('https')
+
         count = 0
+        delay = RESULT_RETRY_DELAY
         while count < 5:
             count += 1
-            req =urllib2.Request(url_string)
-            if self.cookie:
-                logging.debug('[LongPollingRespHandler thread]add cookie to http header')
-                req.add_header('cookie', self.cookie)
-
-            opener = urllib2.build_opener(DevClient.proxy_handler)
             try:
                 logging.debug('[LongPollingRespHandler thread]try to push result to skynet')
-                res = opener.open(req, json.dumps(result), timeout=DevClient.OTHERAPI_REQUEST_TIMEOUT)
+                res = http_pool.post(url_string, json.dumps(result), timeout=DevClient.OTHERAPI_REQUEST_TIMEOUT, \
+                    headers=headers, proxy=proxy)
 
-                push_module_resp = json.loads(res.read())
+                push_module_resp = json.loads(res)
                 logging.debug('[LongPollingRespHandler thread]get push_module resp : %s', str(push_module_resp))
                 if push_module_resp['subscribers'] != '0':
                     logging.debug('[LongPollingRespHandler thread]skynet subscribe this channel')
                     break
 
                 logging.debug('[LongPollingRespHandler thread]no active subscribers in this channel, retry times is %s', str(count))
-                time.sleep(1)
-                continue
 
             except Exception, e:
                 logging.error(traceback.format_exc())
-                time.sleep(1)
-                continue
+
+            if count < 5:
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
 
 class LongPolling(threading.Thread):
     def run(self):
@@ -240,8 +310,7 @@ class LongPolling(threading.Thread):
         cookie = ''
         cookie_timeout_count = 0
         content_data = None
-        last_prefix_id = ''  ##remember the last prefix_id to avoid getting same cmd twice
-        last_cmd_time = 0
+        commands = CommandPool()  # also drops a cmd seen twice, by prefix_id
         while 1:
             guid = None
             record_instance_ip_serial += 1
@@ -263,11 +332,12 @@ class LongPolling(threading.Thread):
                 #opener = urllib2.build_opener(DevClient.proxy_handler)
                 opener = DevClient.buildValidatingOpener(DevClient.CA_CERT, DevClient.proxy_handler)
                 if cookie == '':
-                    opener.addheaders = [(DevClient.HEADER_GUID, guid), (DevClient.HEADER_SERIAL, str(record_instance_ip_serial))]
+                    opener.addheaders = [(DevClient.HEADER_GUID, guid), (DevClient.HEADER_SERIAL, str(record_instance_ip_serial)), \
+                    (HEADER_RESP_CHANNEL, '1')]
 
                 else:
                     opener.addheaders = [(DevClient.HEADER_GUID, guid), (DevClient.HEADER_SERIAL, str(record_instance_ip_serial)), \
-                    ('cookie', cookie)]
+                    (HEADER_RESP_CHANNEL, '1'), ('cookie', cookie)]
 
                 res = opener.open('https://' + DevClient.push_server + '/DevReg/V1.0/record_instance_ip', timeout=DevClient.OTHERAPI_REQUEST_TIMEOUT)
                 #logging.debug(str(res.info()))
@@ -308,6 +378,7 @@ class LongPolling(threading.Thread):
                         prefix_id     = result['prefix_id']
                         callback_name = result['callback_name']
                         callback_data = result['callback_data']
+                        resp_channel  = result.get('resp_channel')
                     except Exception, e:
                         logging.error(traceback.format_exc())
                         logging.error('[Websocket thread]content from push server is not correct format')
@@ -315,26 +386,9 @@ class LongPolling(threading.Thread):
                     logging.info('[Websocket thread]after get data from result')
 
                     logging.info('[Websocket thread]prefix_id: %s', prefix_id)
-                    # global last_prefix_id
-                    # logging.info('[Websocket thread]last_prefix_id: %s', last_prefix_id)
-
-                    #logging.info('[Websocket thread]last_prefix_id: %s', last_prefix_id)
-                    # logging.info('[Websocket thread]prefix_id: %s', prefix_id)
-                    # logging.info('[Websocket thread]prefix_id is %s, last_prefix_id is %s', prefix_id, last_prefix_id)
-
-                    # if prefix_id == last_prefix_id and abs(current_cmd_time - last_cmd_time) < 60:
-                    #     logging.info('[Websocket thread]get same cmd twice, skip LongPollingRespHandler')
-                    #     return
-                    # else:
-                    #     logging.info('[Websocket thread]get new cmd, do LongPollingRespHandler')
-                    #     last_prefix_id = prefix_id
-                    #     last_cmd_time = int(time.time())
-                    logging.info('[Websocket thread]get new cmd, do LongPollingRespHandler')
-
-                    logging.info('[Websocket thread]Before call LongPollingRespHandler')
-                    resp_handler = LongPollingRespHandler(guid, instance_ip, prefix_id, callback_name, callback_data, cookie)
-                    resp_handler.start()
-                    logging.info('[Websocket thread]After call LongPollingRespHandler')
+                    resp_handler = LongPollingRespHandler(guid, instance_ip, prefix_id, callback_name, callback_data, cookie, resp_channel)
+                    if commands.submit(resp_handler):
+                        logging.info('[Websocket thread]get new cmd, queued for LongPollingRespHandler')
 
                 def on_error(ws, error):
                     logging.info('[Websocket thread]ws error: %s', error)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# rand_token throughput: the old per-byte os.urandom generator vs prefix_token
+# python bench_token.py / python2 bench_token.py
+import os
+import sys
+import string
+import timeit
+from itertools import islice, repeat
+
+import prefix_token
+
+try:
+    from itertools import imap
+except ImportError:
+    imap = map
+
+
+# the original reads bytes as str, which Python 3 has to decode
+urandom_char = os.urandom if str is bytes else (lambda n: os.urandom(n).decode('latin1'))
+
+
+def rand_token_old(length = 32):
+    chars = set(string.ascii_letters + string.digits)
+    char_gen = (c for c in imap(urandom_char, repeat(1)) if c in chars)
+    return ''.join(islice(char_gen, None, length))
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for length in (8, 32):
+        for name, fn in (('old', rand_token_old), ('prefix_token', prefix_token.rand_token)):
+            seconds = timeit.timeit(lambda: fn(length), number = number)
+            print('%-13s length %2d: %8.0f tokens/s' % (name, length, number / seconds))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# In-process LRU + TTL cache of QUERY_DEVINFO_API responses, used by push_cmd to route pushes.
+# Works on Python 2.7 and Python 3.
+import time
+import threading
+from collections import OrderedDict
+
+
+class DevInfoCache(object):
+    '''
+        maxsize       entries kept, least recently used ones are dropped first
+        ttl           seconds a device info is reused
+        negative_ttl  seconds an error response ('error_code' in it) is reused
+    '''
+    def __init__(self, maxsize = 100000, ttl = 300, negative_ttl = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()    # id -> (expires, devinfo)
+        self.lock = threading.Lock()
+        self.stats = {'hits' : 0, 'negative_hits' : 0, 'misses' : 0, 'evictions' : 0, 'invalidations' : 0}
+
+    def get(self, id):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.pop(id, None)
+            if entry is None or entry[0] <= now:
+                self.stats['misses'] += 1
+                return None
+            self.entries[id] = entry    # move to the most recently used end
+            if 'error_code' in entry[1]:
+                self.stats['negative_hits'] += 1
+            else:
+                self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, id, devinfo):
+        ttl = self.negative_ttl if 'error_code' in devinfo else self.ttl
+        with self.lock:
+            self.entries.pop(id, None)
+            self.entries[id] = (time.time() + ttl, devinfo)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, id):
+        with self.lock:
+            if self.entries.pop(id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# asyncio heartbeat engine (Python 3).
+# Same plugin contract and schedule as Heartbeat.run, but:
+#   - every plugin's get_api_request() runs concurrently in a thread pool with its
+#     own timeout, a slow plugin is left out of this beat instead of delaying it
+#   - resp_handler() calls are dispatched concurrently the same way
+#   - the heartbeat API is called over one persistent keep-alive HTTPS connection
+#   - beats stay on the drift-corrected HEARTBEAT_INTERVAL grid from the first beat
+import json
+import asyncio
+import traceback
+from concurrent import futures
+
+import aiohttp
+import logging
+
+from common_error import OPTION_HTTP_BODY
+
+
+class HTTPSTransport(object):
+    '''
+        Posts the heartbeat over a single keep-alive connection and returns the
+        same dict as DevClient.do_api_request: error_code 0 with the body, or 25
+        when the request could not be made.
+    '''
+    def __init__(self, url, headers = None, ssl = None, timeout = 30):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.ssl = ssl
+        self.timeout = timeout
+        self.session = None
+
+    async def send(self, data, header_list = ()):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=1, ssl=self.ssl),
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        headers = dict(self.headers)
+        headers.update(header_list)
+        try:
+            async with self.session.post(self.url, data=json.dumps(data), headers=headers) as resp:
+                body = await resp.text()
+                if resp.status >= 400:
+                    return {'error_code' : resp.status, OPTION_HTTP_BODY : body}
+                return {'error_code' : 0, OPTION_HTTP_BODY : body}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error('[Heartbeat engine]heartbeat request failed: %r', e)
+            return {'error_code' : 25, OPTION_HTTP_BODY : None}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class DevClientTransport(object):
+    '''Runs DevClient.do_api_request on a dedicated thread, for when only DevClient knows the endpoint.'''
+    def __init__(self, devclient):
+        self.devclient = devclient
+        self.pool = futures.ThreadPoolExecutor(1)
+
+    async def send(self, data, header_list = ()):
+        kwargs = {'api_name' : 'heartbeat', 'data' : data}
+        if header_list:
+            kwargs['header_list'] = list(header_list)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, lambda: self.devclient.do_api_request(**kwargs))
+
+    async def close(self):
+        self.pool.shutdown(wait=False)
+
+
+class HeartbeatEngine(object):
+    '''
+        plugins         {plugin name : module} with get_api_request/resp_handler/offline_handler
+        transport       HTTPSTransport or DevClientTransport
+        interval        DevClient.HEARTBEAT_INTERVAL
+        plugin_timeout  seconds each plugin call may take before it is skipped for this beat
+        on_error        called with the response when error_code != 0 (unregister, offline handlers ...)
+        on_success      called after a successful beat, e.g. to mark liveness
+    '''
+    def __init__(self, plugins, transport, interval, plugin_timeout = 5, on_error = None, on_success = None, workers = 8):
+        self.plugins = plugins
+        self.transport = transport
+        self.interval = interval
+        self.plugin_timeout = plugin_timeout
+        self.on_error = on_error
+        self.on_success = on_success
+        self.pool = futures.ThreadPoolExecutor(workers)
+        self.busy = set()   # (plugin, method) still running from an earlier beat
+        self.heartbeat_begin = None
+
+    async def call(self, name, method, *args):
+        # a call that timed out keeps running in its thread, do not start another one on top of it
+        key = (name, method)
+        if key in self.busy:
+            logging.error('[Heartbeat engine]%s.%s still running from an earlier beat, skipped', name, method)
+            return None
+        self.busy.add(key)
+        try:
+            # a plugin that failed to import or lacks the method fails this call only, like Heartbeat.run
+            future = asyncio.get_running_loop().run_in_executor(self.pool, getattr(self.plugins[name], method), *args)
+        except Exception as e:
+            self.busy.discard(key)
+            logging.error('[Heartbeat engine]call %s.%s failed: %r', name, method, e)
+            return None
+        future.add_done_callback(lambda f: self.busy.discard(key))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.plugin_timeout)
+        except asyncio.TimeoutError:
+            logging.error('[Heartbeat engine]%s.%s timed out after %ss', name, method, self.plugin_timeout)
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            logging.error('[Heartbeat engine]call %s.%s failed', name, method)
+        return None
+
+    async def collect(self):
+        names = list(self.plugins)
+        results = await asyncio.gather(*[self.call(name, 'get_api_request') for name in names])
+        request_dict = dict(zip(names, results))
+        serial_number_mac = None
+        for tmp in results:
+            for item in tmp or ():
+                if item['api'] == 'guid_check':
+                    serial_number_mac = item['param']
+        return request_dict, serial_number_mac
+
+    async def beat(self):
+        request_dict, serial_number_mac = await self.collect()
+        logging.debug("request_dict %r", request_dict)
+        header_list = [('serial_number', serial_number_mac)] if serial_number_mac is not None else ()
+        resp = await self.transport.send({u'content' : request_dict}, header_list)
+        logging.debug('[Heartbeat engine]get response : %s', str(resp))
+
+        if resp['error_code'] != 0:
+            if self.on_error is not None:
+                await asyncio.get_running_loop().run_in_executor(self.pool, self.on_error, resp)
+            if resp['error_code'] == 25:
+                logging.info('[Heartbeat engine]connection request to skynet failed, run offline callback')
+                await asyncio.gather(*[self.call(name, 'offline_handler') for name in self.plugins])
+            return False
+
+        resp_dict = json.loads(resp[OPTION_HTTP_BODY])
+        await asyncio.gather(*[self.call(name, 'resp_handler', resp_dict[name])
+                               for name in resp_dict if name in self.plugins])
+        if self.on_success is not None:
+            self.on_success()
+        return True
+
+    def next_sleep(self, now):
+        return self.interval - (now - self.heartbeat_begin) % self.interval
+
+    async def run(self, beats = None):
+        loop = asyncio.get_running_loop()
+        if self.heartbeat_begin is None:
+            self.heartbeat_begin = loop.time()
+        count = 0
+        try:
+            while beats is None or count < beats:
+                count += 1
+                try:
+                    await self.beat()
+                except Exception as e:
+                    logging.error(traceback.format_exc())
+                if beats is None or count < beats:
+                    await asyncio.sleep(self.next_sleep(loop.time()))
+        finally:
+            await self.transport.close()
+            self.pool.shutdown(wait=False)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# Keep-alive HTTP connection pool shared by the push functions.
+# Works on Python 2.7 and Python 3.
+import time
+import errno
+import base64
+import socket
+import threading
+
+try:
+    import httplib as http_client
+    from urlparse import urlsplit
+except ImportError:
+    import http.client as http_client
+    from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 30
+
+
+class HTTPError(Exception):
+    def __init__(self, url, status, reason, body):
+        Exception.__init__(self, 'HTTP %s %s: %s' % (status, reason, url))
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def stale_connection(e, sent):
+    # the server closed an idle keep-alive connection before it read the request: nothing came
+    # back, so sending again cannot duplicate it; a timeout may have been processed, never retry
+    if isinstance(e, socket.timeout):
+        return False
+    if isinstance(e, http_client.BadStatusLine):
+        return True     # also RemoteDisconnected on Python 3, closed before any response byte
+    return not sent and getattr(e, 'errno', None) in (errno.ECONNRESET, errno.EPIPE)
+
+
+class ConnectionPool(object):
+    '''
+        maxsize       idle connections kept per host
+        per_host      connections per host, idle + in use; callers wait for a free one
+        idle_timeout  idle connections older than this are closed instead of reused
+    '''
+    def __init__(self, maxsize = 8, per_host = 32, idle_timeout = 60, timeout = DEFAULT_TIMEOUT):
+        self.maxsize = maxsize
+        self.per_host = per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.idle = {}      # (scheme, host, port, proxy) -> [(conn, last_used), ...], newest last
+        self.active = {}    # (scheme, host, port, proxy) -> connections handed out
+        self.cond = threading.Condition()
+        self.stats = {'created' : 0, 'reused' : 0, 'evicted' : 0}
+
+    def new_connection(self, key, timeout):
+        scheme, host, port, proxy = key
+        if proxy:
+            # https goes through a CONNECT tunnel, plain http sends absolute urls to the proxy
+            parts = urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+            if scheme != 'https':
+                return http_client.HTTPConnection(parts.hostname, parts.port or 80, timeout = timeout)
+            conn = http_client.HTTPSConnection(parts.hostname, parts.port or 80, timeout = timeout)
+            headers = {}
+            if parts.username:
+                credentials = '%s:%s' % (parts.username, parts.password or '')
+                headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+            conn.set_tunnel(host, port, headers)
+            return conn
+        if scheme == 'https':
+            return http_client.HTTPSConnection(host, port, timeout = timeout)
+        return http_client.HTTPConnection(host, port, timeout = timeout)
+
+    def evict(self, key, now):
+        idle = self.idle.get(key)
+        while idle and now - idle[0][1] > self.idle_timeout:
+            idle.pop(0)[0].close()
+            self.stats['evicted'] += 1
+
+    def acquire(self, key, timeout, fresh = False):
+        deadline = time.time() + timeout
+        with self.cond:
+            while self.active.get(key, 0) >= self.per_host:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout('no free connection to %s:%s' % key[1:3])
+                self.cond.wait(remaining)
+            self.active[key] = self.active.get(key, 0) + 1
+            self.evict(key, time.time())
+            idle = self.idle.get(key)
+            if idle and not fresh:
+                self.stats['reused'] += 1
+                return idle.pop()[0], True
+            self.stats['created'] += 1
+        return self.new_connection(key, timeout), False
+
+    def release(self, key, conn, reuse):
+        with self.cond:
+            self.active[key] -= 1
+            idle = self.idle.setdefault(key, [])
+            if reuse and len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+            else:
+                conn.close()
+            self.cond.notify()
+
+    def request(self, method, url, body = None, headers = None, timeout = None, proxy = None):
+        if timeout is None:
+            timeout = self.timeout
+        if isinstance(body, type(u'')):
+            body = body.encode('utf-8')
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port, proxy)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        if proxy and parts.scheme != 'https':
+            path = url
+
+        retried = False
+        while True:
+            conn, reused = self.acquire(key, timeout, fresh = retried)
+            reuse = False
+            sent = False
+            try:
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request(method, path, body, headers or {})
+                sent = True
+                resp = conn.getresponse()
+                data = resp.read()
+                reuse = not resp.will_close
+            except (http_client.HTTPException, socket.error) as e:
+                # a stale keep-alive connection is retried once, on a new connection
+                if reused and not retried and stale_connection(e, sent):
+                    retried = True
+                    continue
+                raise
+            finally:
+                self.release(key, conn, reuse)
+            break
+
+        if resp.status >= 400:
+            raise HTTPError(url, resp.status, resp.reason, data)
+        return data
+
+    def close(self):
+        with self.cond:
+            for idle in self.idle.values():
+                for conn, last_used in idle:
+                    conn.close()
+            self.idle.clear()
+
+
+pool = ConnectionPool()
+
+
+def get(url, timeout = None, headers = None, proxy = None):
+    return pool.request('GET', url, None, headers, timeout, proxy)
+
+
+def post(url, body, timeout = None, headers = None, proxy = None):
+    return pool.request('POST', url, body, headers, timeout, proxy)
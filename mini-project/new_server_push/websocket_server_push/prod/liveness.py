@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# Heartbeat liveness marker in a small mmap'd file.
+# The writer updates a counter and a timestamp in place, so a beat is a couple
+# of memory stores instead of open/truncate/write/close on flash. msync is only
+# done every fsync_interval seconds, if at all; the page cache is enough for a
+# watchdog on the same device.
+#
+# layout (32 bytes, native byte order):
+#   magic 'HBT1' | 4 bytes pad | seq uint64 | timestamp float64 (time.time()) | 8 bytes reserved
+# seq is odd while a write is in progress and advances by 2 per beat, readers
+# retry until they see the same even seq before and after reading the timestamp.
+#
+#   python liveness.py [path]   prints the last beat time like the old heartbeat.txt, and its age
+# Works on Python 2.7 and Python 3.
+import os
+import sys
+import mmap
+import time
+import struct
+import datetime
+
+DEFAULT_PATH = '/usr/vtm/tmp/heartbeat.mmap'
+MAGIC = b'HBT1'
+LAYOUT = struct.Struct('=4s4xQd8x')
+SEQ_OFFSET = 8
+SEQ = struct.Struct('=Q')
+TIME_OFFSET = 16
+TIME = struct.Struct('=d')
+
+
+class LivenessMarker(object):
+    def __init__(self, path = DEFAULT_PATH, fsync_interval = None):
+        self.fsync_interval = fsync_interval
+        self.last_fsync = time.time()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != LAYOUT.size:
+                os.ftruncate(fd, LAYOUT.size)
+            self.mm = mmap.mmap(fd, LAYOUT.size)
+        finally:
+            os.close(fd)
+        magic, self.seq, timestamp = LAYOUT.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.seq = 0
+            LAYOUT.pack_into(self.mm, 0, MAGIC, 0, 0.0)
+        self.seq += self.seq & 1    # a writer died mid-update
+
+    def beat(self, now = None):
+        if now is None:
+            now = time.time()
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq + 1)
+        TIME.pack_into(self.mm, TIME_OFFSET, now)
+        self.seq += 2
+        SEQ.pack_into(self.mm, SEQ_OFFSET, self.seq)
+        if self.fsync_interval is not None and now - self.last_fsync >= self.fsync_interval:
+            self.mm.flush()
+            self.last_fsync = now
+
+    def close(self):
+        self.mm.close()
+
+
+def read(path = DEFAULT_PATH, retries = 100):
+    '''(seq, timestamp) of the last beat, or None if there was none yet'''
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), LAYOUT.size, access = mmap.ACCESS_READ)
+    try:
+        for i in range(retries):
+            magic, seq, timestamp = LAYOUT.unpack_from(mm, 0)
+            if magic != MAGIC or seq == 0:
+                return None
+            if not seq & 1 and SEQ.unpack_from(mm, SEQ_OFFSET)[0] == seq:
+                return seq, timestamp
+            time.sleep(0.001)   # let the writer finish, it may be a thread of this process
+        raise RuntimeError('liveness marker %s keeps changing' % path)
+    finally:
+        mm.close()
+
+
+def age(path = DEFAULT_PATH, now = None):
+    '''seconds since the last beat, None if there was none yet'''
+    last = read(path)
+    if last is None:
+        return None
+    return (now or time.time()) - last[1]
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    last = read(path)
+    if last is None:
+        print('no heartbeat yet')
+        sys.exit(1)
+    print('%s seq=%d age=%.1fs' % (datetime.datetime.utcfromtimestamp(last[1]), last[0], time.time() - last[1]))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# Registry of heartbeat_handler plugins.
+#   - plugin names come from a cached manifest, the directory is only listed when
+#     there is no manifest or the directory changed since it was written; the manifest
+#     sits next to the directory, writing it inside would change the mtime it records
+#   - a plugin is imported the first time it is used, so importing Heartbeat.py does not
+#     import them; every plugin adds to the heartbeat request, the first beat loads them all
+#   - changed plugin files are reloaded, checked at most every check_interval seconds
+#   - every call through call() is timed per plugin and method
+# Works on Python 2.7 and Python 3.
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import traceback
+
+try:
+    from importlib import reload
+except ImportError:
+    pass    # Python 2 builtin
+
+
+class PluginUnavailable(KeyError):
+    '''the plugin does not exist or failed to import'''
+
+
+class PluginRegistry(object):
+    def __init__(self, directory, manifest = None, check_interval = 10, slow_call = 1.0):
+        self.directory = os.path.realpath(directory)
+        self.manifest = manifest or self.directory + '.manifest.json'
+        self.check_interval = check_interval
+        self.slow_call = slow_call
+        self.lock = threading.RLock()
+        self.modules = {}       # name -> (module, mtime of its file)
+        self.broken = {}        # name -> mtime of the file that failed to import
+        self.timings = {}       # (name, method) -> [calls, total seconds, max seconds]
+        self.last_check = time.time()
+        self.plugin_names, self.dir_mtime = self.load_manifest()
+        if self.directory not in sys.path:
+            sys.path.append(self.directory)
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest) as f:
+                data = json.load(f)
+            return data['plugins'], data['mtime']
+        except (IOError, OSError, ValueError, KeyError):
+            return self.scan()
+
+    def scan(self):
+        mtime = os.stat(self.directory).st_mtime
+        names = sorted(f[:-3] for f in os.listdir(self.directory) if f.endswith('.py'))
+        try:
+            with open(self.manifest, 'w') as f:
+                json.dump({'plugins' : names, 'mtime' : mtime}, f)
+        except (IOError, OSError) as e:
+            # read-only install: works without it, the directory is listed on every start
+            logging.warning('cannot write plugin manifest %s: %s', self.manifest, e)
+        return names, mtime
+
+    def path(self, name):
+        return os.path.join(self.directory, name + '.py')
+
+    def names(self):
+        self.check()
+        return list(self.plugin_names)
+
+    def get(self, name):
+        # the plugin module, or None if it does not exist or fails to import
+        with self.lock:
+            entry = self.modules.get(name)
+            if entry is not None:
+                return entry[0]
+            if name not in self.plugin_names:
+                return None
+            try:
+                mtime = os.stat(self.path(name)).st_mtime
+            except OSError:
+                return None
+            if self.broken.get(name) == mtime:
+                return None
+            try:
+                module = __import__(name)
+            except Exception as e:
+                logging.error(traceback.format_exc())
+                self.broken[name] = mtime
+                return None
+            self.modules[name] = (module, mtime)
+            self.broken.pop(name, None)
+            return module
+
+    def check(self):
+        now = time.time()
+        if now - self.last_check < self.check_interval:
+            return
+        with self.lock:
+            self.last_check = now
+            try:
+                if os.stat(self.directory).st_mtime != self.dir_mtime:
+                    self.plugin_names, self.dir_mtime = self.scan()
+            except OSError:
+                logging.error(traceback.format_exc())
+            for name in list(self.modules):
+                module, mtime = self.modules[name]
+                try:
+                    current = os.stat(self.path(name)).st_mtime
+                except OSError:
+                    del self.modules[name]  # plugin file removed
+                    continue
+                if current == mtime:
+                    continue
+                try:
+                    self.modules[name] = (reload(module), current)
+                    logging.info('plugin %s reloaded', name)
+                except Exception as e:
+                    logging.error(traceback.format_exc())
+                    logging.error('reload plugin %s failed, keep the old one', name)
+                    self.modules[name] = (module, current)
+
+    def call(self, name, method, *args):
+        module = self.get(name)
+        if module is None:
+            raise PluginUnavailable(name)
+        start = time.time()
+        try:
+            return getattr(module, method)(*args)
+        finally:
+            elapsed = time.time() - start
+            with self.lock:
+                timing = self.timings.setdefault((name, method), [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+            if elapsed >= self.slow_call:
+                logging.info('plugin %s.%s took %.3fs', name, method, elapsed)
+
+    def timing_report(self):
+        with self.lock:
+            return dict(('%s.%s' % key, {'calls' : calls, 'avg' : total / calls, 'max' : slowest})
+                        for key, (calls, total, slowest) in self.timings.items())
+
+    # mapping interface, so the registry can stand in for {name : module}
+    def __iter__(self):
+        return iter(self.names())
+
+    def __contains__(self, name):
+        return name in self.plugin_names
+
+    def __getitem__(self, name):
+        module = self.get(name)
+        if module is None:
+            raise PluginUnavailable(name)
+        return module
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# Random base62 ids (prefix_id etc.) from a single os.urandom call.
+# Works on Python 2.7 and Python 3.
+import os
+import string
+
+ALPHABET = string.ascii_letters + string.digits
+# 248 = 4 * 62: bytes below it map onto the alphabet uniformly, the rest are
+# dropped, so only 3% of the random bytes are wasted and there is no modulo bias
+_LIMIT = 256 - 256 % len(ALPHABET)
+_TABLE = bytes(bytearray(ord(ALPHABET[i % len(ALPHABET)]) for i in range(256)))
+_DROP = bytes(bytearray(range(_LIMIT, 256)))
+
+
+def rand_token(length = 32):
+    token = b''
+    while len(token) < length:
+        # ask for a few extra bytes so one call is almost always enough
+        need = length - len(token)
+        token += os.urandom(need + need // 16 + 2).translate(_TABLE, _DROP)
+    token = token[:length]
+    return token if isinstance(token, str) else token.decode('ascii')
@@ -2,14 +2,19 @@
 import ssl
 import websocket
 import os, sys, string, random, datetime
-from itertools import islice, imap, repeat
-import urllib2, httplib
 import json
 import time
 import slogging as logging
-import ConfigParser
 import traceback
 import ssl
+import http_pool
+import resp_mux
+from devinfo_cache import DevInfoCache
+from prefix_token import rand_token
+try:
+    import ConfigParser
+except ImportError:
+    import configparser as ConfigParser
 
 DEVREG_PUSH_SERVER     = '{host}'
 ICS_PUSH_SERVER_API = 'http://{host}:{port}/DevAPI/V1.0/push_icscmd'
@@ -17,133 +22,141 @@ ENABLE_CMS          = False
 CMS_PUSH_SERVER_API = 'http://{host}:{port}/DevAPI/V1.0/push_cmscmd'
 QUERY_DEVINFO_API      = 'http://{host}:{port}/devmgmt/v1.0/device'
 OPTION_LONG_POLLING_IP = 'long_polling_instance_ip'
+OPTION_RESP_CHANNEL    = 'resp_channel'
 DEPLOY_ENV             = '{env}'
+# devices answer on one shared websocket per push server; only the updated Heartbeat.py
+# honours resp_channel, older devices reply on guid+prefix_id and would always time out.
+# Devices that advertise it with record_instance_ip have OPTION_RESP_CHANNEL set in their
+# device info and always use it; turn this on once every device runs the updated Heartbeat.py
+SHARED_RESPONSE_CHANNEL = False
 ssl._create_default_https_context = ssl._create_unverified_context
+DEVINFO_CACHE          = DevInfoCache()
 
-def rand_token(length = 32):
-    chars = set(string.ascii_letters + string.digits)
-    char_gen = (c for c in imap(os.urandom, repeat(1)) if c in chars)
-    return ''.join(islice(char_gen, None, length))
-
-
-def push_devcmd(device_guid, push_server_ip, cmd, param, getresp_timeout = 30):
-
-
+def push_devcmd(device_guid, push_server_ip, cmd, param, getresp_timeout = 30, shared_channel = None):
+    if shared_channel is None:
+        shared_channel = SHARED_RESPONSE_CHANNEL
     prefix_id = str(rand_token(8))
     logging.debug('Enter push_devcmd. device is %s, prefix_id is %s, push_server is %s, cmd is %s', device_guid, prefix_id, push_server_ip, cmd)
-    res_count = 0
-    while 1:
-        res_count += 1
-        count = 0
-        while count < 3:
-            count += 1
-
-            opener = urllib2.build_opener()
-            try:
-                if DEPLOY_ENV == 'AWS':
-                    result = opener.open('http://' + push_server_ip + '/broadcast/pub?channel=' + \
-                        device_guid, json.dumps({'callback_name' : cmd, 'callback_data' : param, \
-                            'prefix_id' : prefix_id, 'guid' : device_guid, 'instance_ip' : push_server_ip}))
-                else:
-                    result = opener.open('http://' + push_server_ip + '/broadcast/pub?channel=' + \
-                        device_guid, json.dumps({'callback_name' : cmd, 'callback_data' : param, \
-                            'prefix_id' : prefix_id, 'guid' : device_guid, 'instance_ip' : push_server_ip}))
-
-            except Exception, e:
-                    logging.error(traceback.format_exc())
-                #return 'push msg error.'
-                    if count == 3:
-                        return {'error_msg' : 'push cmd server error', 'error_code' : '21', 'succeed' : False}
-                    time.sleep(1)
-                    continue
-
-            push_module_resp = json.loads(result.read())
-            logging.debug('request is send, the cmd message will store this guid channel in 300s. did:%r server response is %s',device_guid, str(push_module_resp))
-            if str(push_module_resp['subscribers']) == '0':
-                logging.info('no active subscribers in this channel,did:%r, retry times is %s', device_guid,str(count))
-                if count == 3:
-                    logging.error('device is: %s, prefix_id is %s, cmd is %s, not in its guid channel', device_guid, prefix_id, cmd)
-                    return {'error_code' : '35', 'error_msg' : 'device is not in its guid channel now', 'succeed' : False}
-                else:
-                    time.sleep(2)
-                    continue
+    message = {'callback_name' : cmd, 'callback_data' : param, \
+        'prefix_id' : prefix_id, 'guid' : device_guid, 'instance_ip' : push_server_ip}
+
+    # listen for the response before publishing, a fast device can answer right away
+    mux = waiter = ws = None
+    if getresp_timeout:
+        try:
+            if shared_channel:
+                mux = resp_mux.get_mux(push_server_ip)
+                waiter = mux.register(prefix_id, getresp_timeout)
+                if waiter is None:
+                    raise Exception('response channel on %s is not open' % push_server_ip)
+                message['resp_channel'] = mux.channel
             else:
-                logging.debug('device subscribe its guid channel')
-                break
-    ##we can verify if there is a longpolling request from device by result
+                url = 'wss://{}/broadcast/sub?channel={}'.format(push_server_ip, device_guid+prefix_id)
+                ws = websocket.create_connection(url, sslopt={"cert_reqs": ssl.CERT_NONE})
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            return {'succeed' : False, 'error_code' : '35', 'error_msg' : 'device is not in its pushcmd response channel'}
+
+    try:
+        error = publish_devcmd(device_guid, push_server_ip, prefix_id, message, getresp_timeout)
+        if error:
+            return error
 
-    #######################################################################
         if getresp_timeout == 0:
             logging.debug('set response timeout 0, no need to wait for response of dev')
             return {'succeed' : True, 'response' : {'msg' : 'no need wait for cmd  response'}}
 
-        try:
-        #set timeout 30 seconds
-        #subconn = httplib.HTTPConnection(push_server_ip, timeout=getresp_timeout)
-            """
-            if DEPLOY_ENV == 'AWS':
-                subconn = httplib.HTTPConnection(push_server_ip, timeout=getresp_timeout)
-            else:
-                subconn = httplib.HTTPConnection(push_server_ip, timeout=getresp_timeout)
-            subconn.request('GET', '/broadcast/sub?channel=' + device_guid + prefix_id)
-            resp = subconn.getresponse()
-            resp_data = json.loads(resp.read())
-            logging.debug('response body length is %s', len(resp_data))
-            subconn.close()
-            """
-            url = 'wss://{}/broadcast/sub?channel={}'.format(push_server_ip, device_guid+prefix_id)
-            ws = websocket.create_connection(url, slopt={"cert_reqs": ssl.CERT_NONE})
-            ws.settimeout(getresp_timeout)
-            resp = ws.recv()
-            resp_data = json.loads(resp.read())
-            logging.info('response body is %s', resp_data)
+        if mux:
+            ok, resp_data = mux.wait(prefix_id, waiter, getresp_timeout)
+        else:
+            ok, resp_data = recv_response(ws, getresp_timeout)
+        if not ok:
+            logging.error('device is not in its pushcmd response channel, device_id %r, prefix_id is %s', device_guid, prefix_id)
+            return {'succeed' : False, 'error_code' : '35', 'error_msg' : 'device is not in its pushcmd response channel'}
+        logging.info('response body is %s', resp_data)
+        return {'succeed' : True, 'response' : resp_data}
+    finally:
+        if mux:
+            mux.cancel(prefix_id)
+        if ws:
             ws.close()
-        except Exception, e:
-            logging.error(traceback.format_exc())
-            logging.error('device is not in its pushcmd response channel, device_id %r,res_count is %s',device_guid, str(res_count))
-            if res_count > 1:
-                return {'succeed' : False, 'error_code' : '35', 'error_msg' : 'device is not in its pushcmd response channel'}
-            else:
-                time.sleep(5)
-                continue
 
-        return {'succeed' : True, 'response' : resp_data}
+
+def publish_devcmd(device_guid, push_server_ip, prefix_id, message, getresp_timeout):
+    count = 0
+    while count < 3:
+        count += 1
+        try:
+            result = http_pool.post('http://' + push_server_ip + '/broadcast/pub?channel=' + \
+                device_guid, json.dumps(message))
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            if count == 3:
+                return {'error_msg' : 'push cmd server error', 'error_code' : '21', 'succeed' : False}
+            time.sleep(1)
+            continue
+
+        push_module_resp = json.loads(result)
+        logging.debug('request is send, the cmd message will store this guid channel in 300s. did:%r server response is %s',device_guid, str(push_module_resp))
+        if str(push_module_resp['subscribers']) != '0':
+            logging.debug('device subscribe its guid channel')
+            return None
+        if getresp_timeout:
+            # the device is not connected right now; the channel keeps the cmd and hands it over
+            # when the device reconnects, so wait for the response instead of publishing it again
+            logging.info('no active subscribers in this channel,did:%r, wait %ss for the device', device_guid, getresp_timeout)
+            return None
+        break
+    logging.error('device is: %s, prefix_id is %s, cmd is %s, not in its guid channel', device_guid, prefix_id, message['callback_name'])
+    return {'error_code' : '35', 'error_msg' : 'device is not in its guid channel now', 'succeed' : False}
+
+
+def recv_response(ws, timeout):
+    # per-command channel, used when SHARED_RESPONSE_CHANNEL is off; skip push stream pings
+    deadline = time.time() + timeout
+    try:
+        while 1:
+            ws.settimeout(max(deadline - time.time(), 0.001))
+            resp = ws.recv()
+            if resp.strip():
+                return True, json.loads(resp)
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        return False, None
 
 
 def push_icscmd(company_guid, cmd, param, ics_agent_ip = None, getresp_timeout = 30):
     if getresp_timeout == 0:
         getresp_timeout = 30
-    opener = urllib2.build_opener()
     try:
-        result = opener.open(ICS_PUSH_SERVER_API, json.dumps({'cmd' : cmd, 'data' : param, \
+        result = http_pool.post(ICS_PUSH_SERVER_API, json.dumps({'cmd' : cmd, 'data' : param, \
                 'company_guid' : company_guid, 'ics_agent_ip' : ics_agent_ip, 'timeout' : getresp_timeout}), timeout=getresp_timeout)
-        resp_data = json.loads(result.read())
-        if resp_data.has_key('error_code'):
+        resp_data = json.loads(result)
+        if 'error_code' in resp_data:
             resp_data.update({'succeed' : False})
             return resp_data
 
         return {'succeed' : True, 'response' : resp_data}
 
-    except Exception, e:
+    except Exception as e:
         logging.error(traceback.format_exc())
         return {'error_code' : '21', 'error_msg' : 'push ics cmd server error', 'succeed' : False}
 
 def push_cmscmd(company_guid, cmd, param, cms_agent_ip = None, getresp_timeout = 30):
     if getresp_timeout == 0:
         getresp_timeout = 30
-    opener = urllib2.build_opener()
     try:
-        result = opener.open(CMS_PUSH_SERVER_API, json.dumps({'cmd' : cmd, 'data' : param, \
+        result = http_pool.post(CMS_PUSH_SERVER_API, json.dumps({'cmd' : cmd, 'data' : param, \
                 'company_guid' : company_guid, 'cms_agent_ip' : cms_agent_ip, 'timeout' : getresp_timeout}), timeout=getresp_timeout)
-        resp_data = json.loads(result.read())
+        resp_data = json.loads(result)
         logging.debug("push_cmscmd resp_data:" + json.dumps(resp_data))
-        if resp_data.has_key('error_code'):
+        if 'error_code' in resp_data:
             resp_data.update({'succeed' : False})
             return resp_data
 
         return {'succeed' : True, 'response' : resp_data}
 
-    except Exception, e:
+    except Exception as e:
         logging.error(traceback.format_exc())
         return {'error_code' : '21', 'error_msg' : 'push cms cmd server error', 'succeed' : False}
 
@@ -171,23 +184,33 @@ def push_cmscmd(company_guid, cmd, param, cms_agent_ip = None, getresp_timeout =
         }
 '''
 def push_cmd(id, cmd, param, res_timeout = 30):
-    try:
-        opener = urllib2.build_opener()
-        result = opener.open(QUERY_DEVINFO_API+'?id=' + str(id), timeout=30)
-        devinfo_dict = json.loads(result.read())
-    except Exception, e:
-        logging.error(traceback.format_exc())
-        return {'error_code' : '45', 'error_msg' : 'get dev info error', 'succeed' : False}
+    devinfo_dict = DEVINFO_CACHE.get(id)
+    if devinfo_dict is None:
+        try:
+            result = http_pool.get(QUERY_DEVINFO_API+'?id=' + str(id), timeout=30)
+            devinfo_dict = json.loads(result)
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            return {'error_code' : '45', 'error_msg' : 'get dev info error', 'succeed' : False}
+        DEVINFO_CACHE.put(id, devinfo_dict)
 
     if 'error_code' in devinfo_dict:
         logging.error('get dev info error')
         return {'error_code' : '45', 'error_msg' : 'get dev info error', 'succeed' : False}
 
+    result = push_by_devinfo(id, devinfo_dict, cmd, param, res_timeout)
+    if result.get('error_code') == '35':
+        # the device may have moved to another push server, look it up again next time
+        DEVINFO_CACHE.invalidate(id)
+    return result
+
+
+def push_by_devinfo(id, devinfo_dict, cmd, param, res_timeout):
     if devinfo_dict['Type'] == 'ICSCOMPANY':
         logging.debug('input id is company guid')
         try:
             ics_agent_ip = devinfo_dict['home_dc']
-        except Exception, e:
+        except Exception as e:
             logging.error('get ics agent ip failed')
             ics_agent_ip = None
         return push_icscmd(id, cmd, param, ics_agent_ip, res_timeout)
@@ -195,14 +218,14 @@ def push_cmd(id, cmd, param, res_timeout = 30):
     elif devinfo_dict['Type'] == 'ICS':
         try:
             ics_agent_ip = devinfo_dict['home_dc']
-        except Exception, e:
+        except Exception as e:
             logging.error('get ics agent ip failed')
             ics_agent_ip = None
         return push_icscmd(devinfo_dict['CompanyID'], cmd, param, ics_agent_ip, res_timeout)
     elif devinfo_dict['Type'] == 'CMS':
         try:
             cms_agent_ip = devinfo_dict['home_dc']
-        except Exception, e:
+        except Exception as e:
             logging.error('get cms agent ip failed')
             cms_agent_ip = None
         return push_cmscmd(devinfo_dict['CompanyID'], cmd, param, cms_agent_ip, res_timeout)
@@ -210,12 +233,13 @@ def push_cmd(id, cmd, param, res_timeout = 30):
     else:
         try:
             instance_ip = devinfo_dict[OPTION_LONG_POLLING_IP]
-        except Exception, e:
+        except Exception as e:
             instance_ip = None
 
         if not instance_ip:
             instance_ip = DEVREG_PUSH_SERVER
-        return push_devcmd(id, instance_ip, cmd, param, res_timeout)
+        return push_devcmd(id, instance_ip, cmd, param, res_timeout,
+            SHARED_RESPONSE_CHANNEL or bool(devinfo_dict.get(OPTION_RESP_CHANNEL)))
 
 
 """
@@ -225,32 +249,33 @@ def automation_setting():
     skynet_ini = '/etc/skynet/skynet-env.ini'
     try:
         config = ConfigParser.ConfigParser()
-        config.readfp(open(skynet_ini, 'rb'))
-    except Exception, e:
+        with open(skynet_ini) as f:
+            (config.read_file if hasattr(config, 'read_file') else config.readfp)(f)
+    except Exception as e:
         logging.exception('cannot open configuration file %s', skynet_ini)
         return False
 
     try:
         host = config.get('DevRegMgmtRole', 'ROLE_HOST')
-    except Exception, e:
+    except Exception as e:
         logging.exception('cannot read option skynet-env.ini -> [DevRegMgmtRole] -> ROLE_HOST')
         return False
 
     try:
         port = config.get('DevRegMgmtRole', 'ROLE_PORT')
-    except Exception, e:
+    except Exception as e:
         logging.exception('cannot read option skynet-env.ini -> [DevRegMgmtRole] -> ROLE_PORT')
         return False
 
     try:
         deploy_env = config.get('Roles', 'DEPLOY_ENV')
-    except Exception, e:
+    except Exception as e:
         logging.exception('cannot read option skynet-env.ini -> [Roles] -> DEPLOY_ENV')
         return False
     global ENABLE_CMS
     try:
         ENABLE_CMS = config.get('DevRegMgmtRole', 'ENABLE_CMS') == '1'
-    except Exception, e:
+    except Exception as e:
         logging.exception('cannot read option skynet-env.ini -> [Roles] -> DEPLOY_ENV')
         return False
 
@@ -283,6 +308,6 @@ def set_server_address(host, port, env):
 
 if __name__ == '__main__':
     set_server_address('10.64.69.221', '8081')
-    print push_cmd('3be529f4-e9b5-4a23-ba21-56efa02ad4e4', 'policy_deploy', {'param1' : 'test_param'})
-    print push_cmd('3be529f4-e9b5-4a23-ba21-56efa02ad4e4', 'test_cmd', {'param1' : 'test_param'})
+    print(push_cmd('3be529f4-e9b5-4a23-ba21-56efa02ad4e4', 'policy_deploy', {'param1' : 'test_param'}))
+    print(push_cmd('3be529f4-e9b5-4a23-ba21-56efa02ad4e4', 'test_cmd', {'param1' : 'test_param'}))
     #print push_icscmd('xxcompany.com', 'deploypolicy', {'param1' : 'test_param'})
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Push one command to many devices concurrently (Python 3, asyncio + aiohttp).
+# Server addresses come from push_cmd, configure them there with
+# set_server_address() or automation_setting() first.
+import json
+import asyncio
+import traceback
+
+import aiohttp
+
+import slogging as logging
+import push_cmd
+
+def no_response():
+    # a new dict per device, callers may change their results
+    return {'succeed' : False, 'error_code' : '35', 'error_msg' : 'device is not in its pushcmd response channel'}
+
+
+def not_pushed():
+    # never got a slot before the deadline, nothing was sent and the device can be retried
+    return {'succeed' : False, 'error_code' : '36', 'error_msg' : 'cmd not pushed before deadline'}
+
+
+class Fanout(object):
+    '''
+        concurrency  devices in flight: lookup, publish and response wait; a device keeps its
+                     slot until its response arrives or res_timeout expires
+        per_server   concurrent publishes per push server, over keep-alive connections
+        res_timeout  seconds to wait for each device response, 0 means do not wait
+    '''
+    def __init__(self, session, cmd, param, concurrency, per_server, res_timeout):
+        self.session = session
+        self.cmd = cmd
+        self.param = param
+        self.slots = asyncio.Semaphore(concurrency)
+        self.per_server = per_server
+        self.servers = {}
+        self.res_timeout = res_timeout
+        self.started = set()    # ids that got a slot, the others were never pushed
+
+    async def get_json(self, method, url, **kwargs):
+        async with self.session.request(method, url, **kwargs) as resp:
+            resp.raise_for_status()
+            return json.loads(await resp.read())
+
+    async def push(self, id):
+        async with self.slots:
+            self.started.add(id)
+            devinfo = push_cmd.DEVINFO_CACHE.get(id)
+            if devinfo is None:
+                try:
+                    devinfo = await self.get_json('GET', push_cmd.QUERY_DEVINFO_API + '?id=' + str(id))
+                except Exception as e:
+                    logging.error(traceback.format_exc())
+                    return {'error_code' : '45', 'error_msg' : 'get dev info error', 'succeed' : False}
+                push_cmd.DEVINFO_CACHE.put(id, devinfo)
+            if 'error_code' in devinfo:
+                logging.error('get dev info error, id %r', id)
+                return {'error_code' : '45', 'error_msg' : 'get dev info error', 'succeed' : False}
+
+            result = await self.route(id, devinfo)
+            if result.get('error_code') == '35':
+                push_cmd.DEVINFO_CACHE.invalidate(id)
+            return result
+
+    async def route(self, id, devinfo):
+        if devinfo['Type'] == 'ICSCOMPANY':
+            return await self.push_agent(push_cmd.ICS_PUSH_SERVER_API, 'ics', id, devinfo.get('home_dc'))
+        elif devinfo['Type'] == 'ICS':
+            return await self.push_agent(push_cmd.ICS_PUSH_SERVER_API, 'ics', devinfo['CompanyID'], devinfo.get('home_dc'))
+        elif devinfo['Type'] == 'CMS':
+            return await self.push_agent(push_cmd.CMS_PUSH_SERVER_API, 'cms', devinfo['CompanyID'], devinfo.get('home_dc'))
+        instance_ip = devinfo.get(push_cmd.OPTION_LONG_POLLING_IP) or push_cmd.DEVREG_PUSH_SERVER
+        return await self.push_device(id, instance_ip)
+
+    async def push_agent(self, api, kind, company_guid, agent_ip):
+        timeout = self.res_timeout or 30
+        body = json.dumps({'cmd' : self.cmd, 'data' : self.param, 'company_guid' : company_guid,
+                           kind + '_agent_ip' : agent_ip, 'timeout' : timeout})
+        try:
+            resp_data = await self.get_json('POST', api, data=body, timeout=aiohttp.ClientTimeout(total=timeout))
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            return {'error_code' : '21', 'error_msg' : 'push %s cmd server error' % kind, 'succeed' : False}
+        if 'error_code' in resp_data:
+            resp_data.update({'succeed' : False})
+            return resp_data
+        return {'succeed' : True, 'response' : resp_data}
+
+    async def push_device(self, device_guid, push_server_ip):
+        prefix_id = str(push_cmd.rand_token(8))
+        ws = None
+        try:
+            if self.res_timeout:
+                # subscribe before publishing so a fast device cannot answer before we listen
+                ws = await self.session.ws_connect('wss://{}/broadcast/sub?channel={}'.format(
+                    push_server_ip, device_guid + prefix_id), ssl=False)
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            return no_response()
+        try:
+            error = await self.publish(device_guid, push_server_ip, prefix_id)
+            if error:
+                return error
+            if ws is None:
+                return {'succeed' : True, 'response' : {'msg' : 'no need wait for cmd  response'}}
+            try:
+                resp_data = await asyncio.wait_for(self.receive(ws), self.res_timeout)
+            except asyncio.TimeoutError:
+                logging.error('no response from device %r, prefix_id is %s', device_guid, prefix_id)
+                return no_response()
+            if resp_data is None:
+                return no_response()
+            return {'succeed' : True, 'response' : resp_data}
+        finally:
+            if ws is not None:
+                await ws.close()
+
+    async def publish(self, device_guid, push_server_ip, prefix_id):
+        url = 'http://' + push_server_ip + '/broadcast/pub?channel=' + device_guid
+        body = json.dumps({'callback_name' : self.cmd, 'callback_data' : self.param,
+                           'prefix_id' : prefix_id, 'guid' : device_guid, 'instance_ip' : push_server_ip})
+        server = self.servers.get(push_server_ip)
+        if server is None:
+            server = self.servers[push_server_ip] = asyncio.Semaphore(self.per_server)
+        for count in range(1, 4):
+            try:
+                async with server:
+                    push_module_resp = await self.get_json('POST', url, data=body)
+            except Exception as e:
+                logging.error(traceback.format_exc())
+                if count == 3:
+                    return {'error_msg' : 'push cmd server error', 'error_code' : '21', 'succeed' : False}
+                await asyncio.sleep(1)
+                continue
+            if str(push_module_resp['subscribers']) != '0':
+                return None
+            if self.res_timeout:
+                # the channel keeps the cmd until the device reconnects, wait for its response
+                logging.info('no active subscribers in this channel, did:%r, wait %ss for the device', device_guid, self.res_timeout)
+                return None
+            break
+        logging.error('device is: %s, prefix_id is %s, cmd is %s, not in its guid channel', device_guid, prefix_id, self.cmd)
+        return {'error_code' : '35', 'error_msg' : 'device is not in its guid channel now', 'succeed' : False}
+
+    async def receive(self, ws):
+        # skip the push stream pings, the first JSON text message is the device response
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT and msg.data.strip():
+                return json.loads(msg.data)
+        return None
+
+
+async def push_cmd_many_async(ids, cmd, param, concurrency = 1000, per_server = 64, res_timeout = 30, deadline = 300):
+    '''
+        Same inputs and per-device result dicts as push_cmd, for many ids at once.
+        Returns {id : result}. Devices still in flight after deadline seconds
+        get error_code '35'; the push stream keeps messages for 300s anyway.
+        Devices that were still waiting for a slot get error_code '36', the cmd
+        was not sent to them.
+
+        Every device holds one of the concurrency slots for up to res_timeout
+        seconds (plus lookup and publish), so in the worst case, when no device
+        answers, only about concurrency * deadline / res_timeout devices are
+        pushed before the deadline. Keep concurrency >= len(ids) * res_timeout / deadline,
+        e.g. 1000 slots with 30s / 300s cover 10000 devices.
+    '''
+    ids = list(dict.fromkeys(ids))
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=per_server)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        fanout = Fanout(session, cmd, param, concurrency, per_server, res_timeout)
+        if res_timeout and len(ids) * res_timeout > concurrency * deadline:
+            logging.info('%d devices with %d slots may not all be pushed in %ss', len(ids), concurrency, deadline)
+        tasks = dict((asyncio.ensure_future(fanout.push(id)), id) for id in ids)
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    results = {}
+    for task, id in tasks.items():
+        if task in pending and id not in fanout.started:
+            results[id] = not_pushed()
+        elif task in pending:
+            results[id] = {'succeed' : False, 'error_code' : '35', 'error_msg' : 'no response before deadline'}
+        elif task.exception() is not None:
+            logging.error('push to %r failed: %r', id, task.exception())
+            results[id] = {'error_code' : '21', 'error_msg' : 'push cmd server error', 'succeed' : False}
+        else:
+            results[id] = task.result()
+    return results
+
+
+def push_cmd_many(ids, cmd, param, concurrency = 1000, per_server = 64, res_timeout = 30, deadline = 300):
+    return asyncio.run(push_cmd_many_async(ids, cmd, param, concurrency, per_server, res_timeout, deadline))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# One shared websocket per push server for command responses.
+# Each process subscribes once to its own response channel on every push server
+# it talks to, commands carry that channel as 'resp_channel', and the device
+# publishes {'prefix_id' : ..., 'response' : ...} there. Responses are routed to
+# the waiting caller by prefix_id, so nothing is subscribed per command and the
+# channel is already open before the command is published.
+# Works on Python 2.7 and Python 3.
+import os
+import ssl
+import json
+import time
+import binascii
+import threading
+import traceback
+
+import websocket
+import slogging as logging
+
+RECONNECT_DELAY = 1
+
+
+class Waiter(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.ok = False
+
+    def set(self, ok, response = None):
+        self.ok = ok
+        self.response = response
+        self.event.set()
+
+
+class ResponseMux(object):
+    def __init__(self, push_server_ip, channel):
+        self.push_server_ip = push_server_ip
+        self.channel = channel
+        self.waiters = {}   # prefix_id -> Waiter
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target = self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        url = 'wss://{}/broadcast/sub?channel={}'.format(self.push_server_ip, self.channel)
+        while 1:
+            try:
+                ws = websocket.WebSocketApp(url, on_open = self.on_open, on_message = self.on_message,
+                                            on_error = self.on_error, on_close = self.on_close)
+                ws.run_forever(sslopt = {"cert_reqs" : ssl.CERT_NONE}, ping_interval = 30)
+            except Exception as e:
+                logging.error(traceback.format_exc())
+            self.on_close(None)
+            time.sleep(RECONNECT_DELAY)
+
+    def on_open(self, ws):
+        logging.debug('response channel %s on %s is open', self.channel, self.push_server_ip)
+        self.ready.set()
+
+    def on_message(self, ws, message):
+        try:
+            msg = json.loads(message)
+            prefix_id = msg['prefix_id']
+        except Exception as e:
+            return  # push stream pings and anything that is not a response
+        with self.lock:
+            waiter = self.waiters.pop(prefix_id, None)
+        if waiter is not None:
+            waiter.set(True, msg.get('response'))
+
+    def on_error(self, ws, error):
+        logging.info('response channel on %s error: %s', self.push_server_ip, error)
+
+    def on_close(self, ws, *args):
+        # responses published while the socket is down are lost, fail the waiters now
+        self.ready.clear()
+        with self.lock:
+            waiters, self.waiters = self.waiters, {}
+        for waiter in waiters.values():
+            waiter.set(False)
+
+    def register(self, prefix_id, timeout):
+        # call before publishing the command; None if the channel cannot be opened in time
+        if not self.ready.wait(timeout):
+            return None
+        waiter = Waiter()
+        with self.lock:
+            self.waiters[prefix_id] = waiter
+        return waiter
+
+    def wait(self, prefix_id, waiter, timeout):
+        if not waiter.event.wait(timeout):
+            with self.lock:
+                self.waiters.pop(prefix_id, None)
+        return waiter.ok, waiter.response
+
+    def cancel(self, prefix_id):
+        with self.lock:
+            self.waiters.pop(prefix_id, None)
+
+
+muxes_lock = threading.Lock()
+state = {'pid' : None, 'channel' : None, 'muxes' : {}}
+
+
+def get_mux(push_server_ip):
+    with muxes_lock:
+        if state['pid'] != os.getpid():
+            # new process (e.g. forked worker): the listener threads did not come along
+            state['pid'] = os.getpid()
+            state['channel'] = 'resp_' + binascii.hexlify(os.urandom(8)).decode('ascii')
+            state['muxes'] = {}
+        mux = state['muxes'].get(push_server_ip)
+        if mux is None:
+            mux = state['muxes'][push_server_ip] = ResponseMux(push_server_ip, state['channel'])
+        return mux
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# In-process stand-in for the nginx push stream /broadcast locations in cecc_nginx.conf,
+# so pub.py, sub.py and the push functions can run and be load tested without a push server.
+#
+#   POST   /broadcast/pub?channel=ID     publish the body; returns
+#                                        {"channel", "published_messages", "stored_messages", "subscribers"}
+#   GET    /broadcast/pub?channel=ID     the same stats, 404 if the channel does not exist
+#   DELETE /broadcast/pub?channel=ID     delete the channel, its subscribers are disconnected
+#   GET    /broadcast/sub?channel=ID[/ID2...]
+#       websocket      each message is a text frame, an empty text frame is sent every ping_interval,
+#                      text frames from the subscriber are published (push_stream_websocket_allow_publish)
+#       event stream   Accept: text/event-stream, "id:" / "data:" events, resumes after Last-Event-ID
+#       long polling   anything else; one message per response with its cursor as Etag, send it
+#                      back as If-None-Match to get the next one, 304 after longpoll_timeout
+#
+# Messages are kept per channel in a ring of store_messages entries for message_ttl seconds
+# (push_stream_message_ttl 300). A subscriber is only a cursor into those rings: nothing is
+# queued per connection, a publish wakes the subscriber and it sends what it has not seen yet.
+# A subscriber that falls behind by more than the ring skips the lost messages.
+#
+# Memory budget per idle websocket subscriber, measured with aiohttp 3.14 on Python 3.11 with
+# one channel per subscriber (9000 subscribers, +147 MB RSS): about 16 KB of process memory for
+# the connection protocol, request, WebSocketResponse, handler task and its Channel (the
+# Subscriber itself is ~200 bytes), plus the kernel socket buffers, which are outside the
+# process and stay at a few KB for an idle socket. 100k idle subscribers need about 1.6 GB
+# and as many open files; main() raises the open files limit to the hard limit.
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+import collections
+from email.utils import formatdate
+
+from aiohttp import web, WSMsgType
+import logging
+
+
+class Channel(object):
+    __slots__ = ('name', 'ring', 'last_id', 'published', 'subscribers', 'listeners', 'waiter', 'deleted')
+
+    def __init__(self, name, store_messages):
+        self.name = name
+        self.ring = collections.deque(maxlen=store_messages)   # (id, time, text), ids are consecutive
+        self.last_id = 0
+        self.published = 0
+        self.subscribers = set()    # websocket Subscribers
+        self.listeners = 0          # event stream and long polling requests
+        self.waiter = None          # future resolved on the next publish
+        self.deleted = False
+
+    def count(self):
+        return len(self.subscribers) + self.listeners
+
+    def since(self, cursor):
+        # messages after id cursor still in the ring
+        if not self.ring or cursor >= self.last_id:
+            return ()
+        return list(itertools.islice(self.ring, max(cursor + 1 - self.ring[0][0], 0), None))
+
+    def changed(self):
+        if self.waiter is None:
+            self.waiter = asyncio.get_running_loop().create_future()
+        return self.waiter
+
+    def wake(self):
+        if self.waiter is not None:
+            self.waiter.set_result(None)
+            self.waiter = None
+
+    def expire(self, before):
+        while self.ring and self.ring[0][1] < before:
+            self.ring.popleft()
+
+    def stats(self):
+        return {'channel' : self.name, 'published_messages' : self.published,
+                'stored_messages' : len(self.ring), 'subscribers' : self.count()}
+
+
+class Subscriber(object):
+    __slots__ = ('ws', 'channels', 'cursors', 'flushing')
+
+    def __init__(self, ws, channels):
+        self.ws = ws
+        self.channels = channels
+        self.cursors = [channel.last_id for channel in channels]
+        self.flushing = False
+
+    async def flush(self):
+        # send everything after the cursors, the publisher only starts this when it is not running
+        try:
+            sent = True
+            while sent:
+                sent = False
+                for i, channel in enumerate(self.channels):
+                    for msg_id, t, text in channel.since(self.cursors[i]):
+                        self.cursors[i] = msg_id
+                        await self.ws.send_str(text)
+                        sent = True
+        except ConnectionError:
+            pass    # closed, the handler removes the subscriber
+        finally:
+            self.flushing = False
+
+
+def format_cursor(channels, cursors):
+    if len(channels) == 1:
+        return str(cursors[0])
+    return '/'.join('%s:%d' % (channel.name, cursor) for channel, cursor in zip(channels, cursors))
+
+
+def parse_cursor(channels, token):
+    # cursors for channels from an Etag / Last-Event-ID, None where the token has nothing usable
+    token = (token or '').strip().strip('"')
+    if not token:
+        return [None] * len(channels)
+    if len(channels) == 1 and ':' not in token:
+        pairs = {channels[0].name : token}
+    else:
+        pairs = dict(item.rsplit(':', 1) for item in token.split('/') if ':' in item)
+    cursors = []
+    for channel in channels:
+        try:
+            cursors.append(int(pairs[channel.name]))
+        except (KeyError, ValueError):
+            cursors.append(None)
+    return cursors
+
+
+class Broker(object):
+    '''
+        store_messages    messages kept per channel (ring size)
+        message_ttl       seconds a message is kept
+        ping_interval     seconds between empty pings to websocket subscribers and
+                          comments to event stream subscribers
+        longpoll_timeout  seconds a long polling request waits before 304
+        max_message_size  largest message accepted from a websocket subscriber
+        max_publish_size  largest POST /broadcast/pub body (client_max_body_size 50m in cecc_nginx.conf)
+    '''
+    def __init__(self, store_messages = 100, message_ttl = 300, ping_interval = 10,
+                 longpoll_timeout = 30, max_message_size = 64 * 1024, max_publish_size = 50 * 1024 * 1024):
+        self.store_messages = store_messages
+        self.message_ttl = message_ttl
+        self.ping_interval = ping_interval
+        self.longpoll_timeout = longpoll_timeout
+        self.max_message_size = max_message_size
+        self.max_publish_size = max_publish_size
+        self.channels = {}
+        self.pinger = None
+
+    def app(self):
+        app = web.Application(client_max_size=self.max_publish_size)
+        app.router.add_post('/broadcast/pub', self.handle_pub)
+        app.router.add_get('/broadcast/pub', self.handle_stats)
+        app.router.add_delete('/broadcast/pub', self.handle_delete)
+        app.router.add_get('/broadcast/sub', self.handle_sub)
+        app.on_startup.append(self.start)
+        app.on_shutdown.append(self.stop)
+        return app
+
+    async def start(self, app):
+        self.pinger = asyncio.ensure_future(self.ping_loop())
+
+    async def stop(self, app):
+        self.pinger.cancel()
+        for channel in list(self.channels.values()):
+            await self.delete(channel)
+
+    def channel(self, name):
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = Channel(name, self.store_messages)
+        return channel
+
+    def publish(self, name, text):
+        channel = self.channel(name)
+        now = time.time()
+        channel.expire(now - self.message_ttl)
+        channel.last_id += 1
+        channel.published += 1
+        channel.ring.append((channel.last_id, now, text))
+        channel.wake()
+        for sub in channel.subscribers:
+            if not sub.flushing:
+                sub.flushing = True
+                asyncio.ensure_future(sub.flush())
+        return channel
+
+    async def delete(self, channel):
+        channel.deleted = True
+        self.channels.pop(channel.name, None)
+        channel.wake()
+        for sub in list(channel.subscribers):
+            await sub.ws.close()
+
+    async def ping_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            before = time.time() - self.message_ttl
+            for name, channel in list(self.channels.items()):
+                channel.expire(before)
+                if not channel.ring and not channel.count():
+                    del self.channels[name]
+                    continue
+                for sub in channel.subscribers:
+                    if not sub.flushing and not sub.ws.closed:
+                        asyncio.ensure_future(self.ping(sub.ws))
+
+    async def ping(self, ws):
+        try:
+            await ws.send_str('')
+        except ConnectionError:
+            pass
+
+    def channel_names(self, request):
+        names = [name for name in request.query.get('channel', '').split('/') if name]
+        if not names:
+            raise web.HTTPBadRequest(text='No channel id provided.')
+        return names
+
+    async def handle_pub(self, request):
+        names = self.channel_names(request)
+        text = (await request.read()).decode('utf-8', 'replace')
+        for name in names:
+            channel = self.publish(name, text)
+        return web.json_response(channel.stats())
+
+    async def handle_stats(self, request):
+        channel = self.channels.get(self.channel_names(request)[0])
+        if channel is None:
+            raise web.HTTPNotFound(text='Channel id not found.')
+        return web.json_response(channel.stats())
+
+    async def handle_delete(self, request):
+        channel = self.channels.get(self.channel_names(request)[0])
+        if channel is None:
+            raise web.HTTPNotFound(text='Channel id not found.')
+        await self.delete(channel)
+        return web.Response(text='Channel deleted.')
+
+    async def handle_sub(self, request):
+        channels = [self.channel(name) for name in self.channel_names(request)]
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self.subscribe_websocket(request, channels)
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            return await self.subscribe_event_stream(request, channels)
+        return await self.subscribe_long_polling(request, channels)
+
+    async def subscribe_websocket(self, request, channels):
+        ws = web.WebSocketResponse(max_msg_size=self.max_message_size)
+        await ws.prepare(request)
+        sub = Subscriber(ws, channels)
+        for channel in channels:
+            channel.subscribers.add(sub)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT and msg.data:
+                    for channel in channels:
+                        self.publish(channel.name, msg.data)
+        finally:
+            for channel in channels:
+                channel.subscribers.discard(sub)
+        return ws
+
+    def start_cursors(self, channels, token):
+        # resume after the given cursor, or only new messages when there is none
+        return [channel.last_id if cursor is None else cursor
+                for channel, cursor in zip(channels, parse_cursor(channels, token))]
+
+    async def wait(self, channels, timeout):
+        await asyncio.wait([channel.changed() for channel in channels], timeout=timeout)
+
+    async def subscribe_event_stream(self, request, channels):
+        cursors = self.start_cursors(channels, request.headers.get('Last-Event-ID') or request.query.get('last_event_id'))
+        resp = web.StreamResponse(headers={'Content-Type' : 'text/event-stream', 'Cache-Control' : 'no-cache'})
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        for channel in channels:
+            channel.listeners += 1
+        try:
+            while not any(channel.deleted for channel in channels):
+                chunk = []
+                for i, channel in enumerate(channels):
+                    for msg_id, t, text in channel.since(cursors[i]):
+                        cursors[i] = msg_id
+                        data = ''.join('data: %s\n' % line for line in text.split('\n'))
+                        chunk.append('id: %s\n%s\n' % (format_cursor(channels, cursors), data))
+                if chunk:
+                    await resp.write(''.join(chunk).encode('utf-8'))
+                    continue
+                loop = asyncio.get_running_loop()
+                started = loop.time()
+                await self.wait(channels, self.ping_interval)
+                if loop.time() - started >= self.ping_interval:
+                    await resp.write(b':\n\n')
+        except ConnectionError:
+            pass
+        finally:
+            for channel in channels:
+                channel.listeners -= 1
+        return resp
+
+    async def subscribe_long_polling(self, request, channels):
+        cursors = self.start_cursors(channels, request.headers.get('If-None-Match'))
+        for channel in channels:
+            channel.listeners += 1
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.longpoll_timeout
+            while not any(channel.deleted for channel in channels):
+                for i, channel in enumerate(channels):
+                    pending = channel.since(cursors[i])
+                    if pending:
+                        msg_id, t, text = pending[0]
+                        cursors[i] = msg_id
+                        return web.Response(text=text, headers={
+                            'Etag' : format_cursor(channels, cursors),
+                            'Last-Modified' : formatdate(t, usegmt=True),
+                            'Cache-Control' : 'no-cache'})
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await self.wait(channels, remaining)
+        finally:
+            for channel in channels:
+                channel.listeners -= 1
+        return web.Response(status=304, headers={'Etag' : format_cursor(channels, cursors)})
+
+
+def raise_open_files_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='push stream compatible pub/sub broker')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=80)
+    parser.add_argument('--store-messages', type=int, default=100)
+    parser.add_argument('--message-ttl', type=int, default=300)
+    parser.add_argument('--ping-interval', type=float, default=10)
+    parser.add_argument('--longpoll-timeout', type=float, default=30)
+    parser.add_argument('--max-publish-size', type=int, default=50 * 1024 * 1024, help='largest publish body in bytes')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logging.info('open files limit %s', raise_open_files_limit())
+    broker = Broker(args.store_messages, args.message_ttl, args.ping_interval, args.longpoll_timeout,
+                    max_publish_size=args.max_publish_size)
+    web.run_app(broker.app(), host=args.host, port=args.port, access_log=None, backlog=4096)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
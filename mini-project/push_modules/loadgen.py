@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# Publish load generator for the push stream /broadcast endpoints (nginx or broker.py).
+# Replaces the thread-per-message bursts of client.py and the one-per-second loop of pub.py:
+#   - publishes at a fixed target rate, open loop, over one pooled keep-alive session
+#   - spreads messages round robin over --channels channels
+#   - keeps --subscribers websocket subscribers on every channel and matches what they
+#     receive to what was published, for publish -> deliver latency and lost messages
+#   - prints the achieved publish rate, error rate and latencies every --report seconds
+#
+#   python3 loadgen.py --url http://10.206.66.74 --rate 2000 --channels 100 --duration 60
+#   python3 loadgen.py --local --rate 5000      # against an in-process broker.py
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import aiohttp
+import logging
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../new_server_push/websocket_server_push/prod')
+from prefix_token import rand_token
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+
+class Stats(object):
+    def __init__(self):
+        self.published = 0
+        self.errors = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.late = 0           # publishes started after their slot because --in-flight was full
+        self.publish_latency = []
+        self.deliver_latency = []
+
+    def summary(self, elapsed, expected):
+        publish_latency = sorted(self.publish_latency)
+        deliver_latency = sorted(self.deliver_latency)
+        attempts = self.published + self.errors
+        return {
+            'elapsed' : round(elapsed, 2),
+            'publish_rate' : round(self.published / elapsed, 1) if elapsed else 0.0,
+            'error_rate' : round(float(self.errors) / attempts, 4) if attempts else 0.0,
+            'late' : self.late,
+            'publish_p50_ms' : round(percentile(publish_latency, 0.5) * 1000, 2),
+            'publish_p99_ms' : round(percentile(publish_latency, 0.99) * 1000, 2),
+            'delivered' : self.delivered,
+            'expected' : expected,
+            'duplicates' : self.duplicates,
+            'deliver_p50_ms' : round(percentile(deliver_latency, 0.5) * 1000, 2),
+            'deliver_p99_ms' : round(percentile(deliver_latency, 0.99) * 1000, 2),
+            'deliver_max_ms' : round(deliver_latency[-1] * 1000, 2) if deliver_latency else 0.0,
+        }
+
+
+class LoadGenerator(object):
+    '''
+        url          push server base url, e.g. http://10.206.66.74
+        rate         target publishes per second
+        channels     number of channels, messages go round robin
+        subscribers  websocket subscribers per channel
+        connections  keep-alive connections in the publish pool
+        in_flight    publishes waiting for a response at most; a slot is late when all are busy
+        size         padding bytes added to each message
+    '''
+    def __init__(self, url, rate, channels = 10, subscribers = 1, connections = 64,
+                 in_flight = 1000, size = 0, timeout = 10):
+        self.url = url.rstrip('/')
+        self.rate = rate
+        self.channels = ['loadgen_%s_%d' % (rand_token(6), i) for i in range(channels)]
+        self.subscribers = subscribers
+        self.connections = connections
+        self.in_flight = asyncio.Semaphore(in_flight)
+        self.padding = 'x' * size
+        self.timeout = timeout
+        self.run_id = rand_token(8)
+        self.stats = Stats()
+        self.seen = set()       # (seq, subscriber index) already delivered
+        self.subscribed = 0     # subscriber sockets open
+
+    def ws_url(self, channel):
+        return self.url.replace('http', 'ws', 1) + '/broadcast/sub?channel=' + channel
+
+    async def subscribe(self, session, channel, index, ready):
+        async with session.ws_connect(self.ws_url(channel), heartbeat=None, autoping=True) as ws:
+            self.subscribed += 1
+            ready.set_result(None)
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT or not msg.data:
+                    continue    # push stream pings
+                self.deliver(msg.data, index)
+
+    def deliver(self, text, index):
+        now = time.time()
+        try:
+            msg = json.loads(text)
+            if msg.get('run') != self.run_id:
+                return
+            seq = msg['seq']
+        except (ValueError, KeyError, AttributeError, TypeError):
+            return
+        key = (seq, index)
+        if key in self.seen:
+            self.stats.duplicates += 1
+            return
+        self.seen.add(key)
+        self.stats.delivered += 1
+        self.stats.deliver_latency.append(now - msg['sent'])
+
+    async def publish(self, session, seq):
+        channel = self.channels[seq % len(self.channels)]
+        start = time.time()
+        body = json.dumps({'run' : self.run_id, 'seq' : seq, 'prefix' : rand_token(8),
+                           'sent' : start, 'data' : self.padding})
+        try:
+            async with session.post(self.url + '/broadcast/pub?channel=' + channel, data=body) as resp:
+                await resp.read()
+                if resp.status >= 400:
+                    raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+            self.stats.published += 1
+            self.stats.publish_latency.append(time.time() - start)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats.errors += 1
+            logging.debug('publish %d to %s failed: %r', seq, channel, e)
+        finally:
+            self.in_flight.release()
+
+    async def run(self, duration, report = 1.0, drain = 2.0):
+        loop = asyncio.get_running_loop()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        pub_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connections), timeout=timeout)
+        sub_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        subscribers = []
+        try:
+            readies = []
+            for channel in self.channels:
+                for index in range(self.subscribers):
+                    ready = loop.create_future()
+                    readies.append(ready)
+                    subscribers.append(asyncio.ensure_future(self.subscribe(sub_session, channel, index, ready)))
+            if readies:
+                await asyncio.wait(readies, timeout=self.timeout)
+            logging.info('%d/%d subscribers connected', self.subscribed, len(readies))
+
+            publishes = set()
+            start = loop.time()
+            next_report = start + report
+            seq = 0
+            while True:
+                now = loop.time()
+                if now - start >= duration:
+                    break
+                # every slot due by now, the schedule does not slip when the loop was busy
+                due = int((now - start) * self.rate) + 1
+                while seq < due:
+                    if self.in_flight.locked():
+                        self.stats.late += 1
+                    await self.in_flight.acquire()
+                    task = asyncio.ensure_future(self.publish(pub_session, seq))
+                    publishes.add(task)
+                    task.add_done_callback(publishes.discard)
+                    seq += 1
+                if now >= next_report:
+                    logging.info('%s', json.dumps(self.stats.summary(now - start, self.expected())))
+                    next_report += report
+                await asyncio.sleep(max(start + float(seq) / self.rate - loop.time(), 0))
+            elapsed = loop.time() - start
+            if publishes:
+                await asyncio.wait(publishes)
+            await asyncio.sleep(drain)   # let the last messages reach the subscribers
+            return self.stats.summary(elapsed, self.expected())
+        finally:
+            for task in subscribers:
+                task.cancel()
+            await asyncio.gather(*subscribers, return_exceptions=True)
+            await pub_session.close()
+            await sub_session.close()
+
+    def expected(self):
+        return self.stats.published * self.subscribers
+
+
+async def run_local(args):
+    # broker.py on a free port of this process; it shares the CPU with the generator
+    from aiohttp import web
+    import broker
+    runner = web.AppRunner(broker.Broker().app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        return await run(args, 'http://127.0.0.1:%d' % port)
+    finally:
+        await runner.cleanup()
+
+
+async def run(args, url):
+    generator = LoadGenerator(url, args.rate, args.channels, args.subscribers, args.connections,
+                              args.in_flight, args.size, args.timeout)
+    return await generator.run(args.duration, args.report)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='push stream publish load generator')
+    parser.add_argument('--url', default='http://127.0.0.1')
+    parser.add_argument('--local', action='store_true', help='start broker.py in this process and use it')
+    parser.add_argument('--rate', type=float, default=1000, help='target publishes per second')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--subscribers', type=int, default=1, help='websocket subscribers per channel')
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--in-flight', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=0, help='padding bytes per message')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--report', type=float, default=1.0, help='seconds between progress lines')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if args.local:
+        result = asyncio.run(run_local(args))
+    else:
+        result = asyncio.run(run(args, args.url))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
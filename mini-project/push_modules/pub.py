@@ -1,6 +1,5 @@
 #!/usr/bin/env python
 import os, sys, string, random, datetime
-from itertools import islice, imap, repeat
 import urllib2, httplib
 import json
 import time
@@ -11,10 +10,8 @@ import traceback
 import ssl
 import time, thread
 
-def rand_token(length = 32):
-    chars = set(string.ascii_letters + string.digits)
-    char_gen = (c for c in imap(os.urandom, repeat(1)) if c in chars)
-    return ''.join(islice(char_gen, None, length))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../new_server_push/websocket_server_push/prod')
+from prefix_token import rand_token
 
 def push_devcmd(node):
     print node
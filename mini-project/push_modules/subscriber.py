@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# Push stream subscriber library (asyncio), in place of the reconnect-per-message loops of
+# sub.py and server.py:
+#   - all subscriptions share one aiohttp session, so the TLS context is created once and
+#     every subscription keeps its keep-alive connection between polls
+#   - 'stream' mode reads a text/event-stream response incrementally, message by message
+#   - 'longpoll' mode sends the last Etag / Last-Modified back as If-None-Match /
+#     If-Modified-Since, the push stream long polling convention
+#   - after a dropped connection it reconnects with backoff and resumes after the last
+#     message id (Last-Event-ID or Etag), so nothing still stored on the server is missed
+#   - thousands of subscriptions run as tasks of one process, see subscribe_many()
+#
+#   async with aiohttp.ClientSession() as session:
+#       async for msg in Subscription(session, 'https://push01', '123456'):
+#           print(msg.id, msg.data)
+#
+#   python3 subscriber.py --url http://127.0.0.1:8099 --channel 123456
+#   python3 subscriber.py --url http://127.0.0.1:8099 --count 5000 --quiet
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+import logging
+
+
+class Message(object):
+    __slots__ = ('channel', 'id', 'event', 'data')
+
+    def __init__(self, channel, id, event, data):
+        self.channel = channel
+        self.id = id
+        self.event = event
+        self.data = data
+
+    def __repr__(self):
+        return 'Message(%r, %r, %r)' % (self.channel, self.id, self.data)
+
+
+class Subscription(object):
+    '''
+        session       shared aiohttp.ClientSession
+        url           push server base url, e.g. https://beta-devmgmt01.beta.cloudedge.trendmicro.com
+        channel       channel id, several as 'a/b'
+        mode          'stream' (text/event-stream) or 'longpoll'
+        last_id       resume after this message id / Etag instead of starting with new messages
+        idle_timeout  seconds without any data (messages or pings) before a stream is reconnected
+        poll_timeout  seconds a long poll may take, above the server's long polling timeout
+        retry         first reconnect delay, doubled up to max_retry while reconnects fail
+    '''
+    def __init__(self, session, url, channel, mode = 'stream', last_id = None, idle_timeout = 60,
+                 poll_timeout = 90, retry = 1.0, max_retry = 30):
+        if mode not in ('stream', 'longpoll'):
+            raise ValueError('unknown mode %r' % mode)
+        self.session = session
+        self.url = url.rstrip('/') + '/broadcast/sub?channel=' + channel
+        self.channel = channel
+        self.mode = mode
+        self.last_id = last_id
+        self.last_modified = None
+        self.idle_timeout = idle_timeout
+        self.poll_timeout = poll_timeout
+        self.retry = retry
+        self.max_retry = max_retry
+        self.reconnects = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def messages(self):
+        delay = self.retry
+        while not self.closed:
+            try:
+                if self.mode == 'stream':
+                    async for msg in self.stream():
+                        delay = self.retry
+                        yield msg
+                else:
+                    msg = await self.poll()
+                    delay = self.retry
+                    if msg is not None:
+                        yield msg
+                    continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.info('subscription %s failed: %r, resume after %r', self.channel, e, self.last_id)
+            if self.closed:
+                break
+            # stream ended or failed, reconnect with jitter so thousands of subscribers do not come back at once
+            self.reconnects += 1
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.max_retry)
+
+    async def stream(self):
+        headers = {'Accept' : 'text/event-stream'}
+        if self.last_id is not None:
+            headers['Last-Event-ID'] = self.last_id
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.idle_timeout)
+        async with self.session.get(self.url, headers=headers, timeout=timeout) as resp:
+            resp.raise_for_status()
+            event_id, event, data = None, None, []
+            async for line in resp.content:
+                line = line.decode('utf-8', 'replace').rstrip('\r\n')
+                if not line:
+                    if event_id is not None:
+                        self.last_id = event_id
+                    if data:
+                        yield Message(self.channel, self.last_id, event, '\n'.join(data))
+                    event_id, event, data = None, None, []
+                    continue
+                if line.startswith(':'):
+                    continue    # keep-alive comment
+                field, _, value = line.partition(':')
+                if value.startswith(' '):
+                    value = value[1:]
+                if field == 'data':
+                    data.append(value)
+                elif field == 'id':
+                    event_id = value
+                elif field == 'event':
+                    event = value
+                elif field == 'retry' and value.isdigit():
+                    self.retry = int(value) / 1000.0
+
+    async def poll(self):
+        headers = {}
+        if self.last_id is not None:
+            headers['If-None-Match'] = self.last_id
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        timeout = aiohttp.ClientTimeout(total=self.poll_timeout)
+        async with self.session.get(self.url, headers=headers, timeout=timeout) as resp:
+            # read the whole body even for 304, or the connection cannot be reused
+            body = await resp.text()
+            if resp.status == 304:
+                self.last_id = resp.headers.get('Etag', self.last_id)
+                return None
+            resp.raise_for_status()
+            self.last_id = resp.headers.get('Etag', self.last_id)
+            self.last_modified = resp.headers.get('Last-Modified', self.last_modified)
+            return Message(self.channel, self.last_id, None, body)
+
+    def close(self):
+        # stops after the current message or poll; cancel the consuming task to stop at once
+        self.closed = True
+
+
+async def subscribe_many(url, channels, handler, mode = 'stream', ssl = False, **kwargs):
+    '''
+        Runs one Subscription per channel in this process until they are all closed
+        or the task is cancelled. handler(message) is called for every message.
+        ssl=False skips certificate checks like sub.py; pass an ssl.SSLContext to verify.
+    '''
+    connector = aiohttp.TCPConnector(limit=0, ssl=ssl)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        subscriptions = [Subscription(session, url, channel, mode, **kwargs) for channel in channels]
+
+        async def consume(subscription):
+            async for msg in subscription:
+                handler(msg)
+
+        await asyncio.gather(*[consume(subscription) for subscription in subscriptions])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='push stream subscriber')
+    parser.add_argument('--url', default='http://127.0.0.1')
+    parser.add_argument('--channel', action='append', default=[])
+    parser.add_argument('--count', type=int, default=0, help='also subscribe to PREFIX0 .. PREFIX<count-1>')
+    parser.add_argument('--prefix', default='sub_')
+    parser.add_argument('--mode', choices=['stream', 'longpoll'], default='stream')
+    parser.add_argument('--quiet', action='store_true', help='print the message rate instead of the messages')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    channels = args.channel + ['%s%d' % (args.prefix, i) for i in range(args.count)]
+    if not channels:
+        parser.error('no channel to subscribe to')
+    received = [0, time.time()]
+
+    def handler(msg):
+        received[0] += 1
+        if not args.quiet:
+            print('%s %s %s' % (msg.channel, msg.id, msg.data))
+        elif time.time() - received[1] >= 1:
+            logging.info('%d messages/s', received[0] / (time.time() - received[1]))
+            received[:] = [0, time.time()]
+
+    try:
+        asyncio.run(subscribe_many(args.url, channels, handler, args.mode))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'mini-project',
+                                'new_server_push', 'websocket_server_push', 'prod'))
+import devinfo_cache
+from devinfo_cache import DevInfoCache
+
+DEVINFO = {'Type' : 'DEV', 'long_polling_instance_ip' : '10.0.0.1'}
+ERROR = {'error_code' : '1'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(devinfo_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_expires_on_ttl(clock):
+    cache = DevInfoCache(ttl = 300)
+    cache.put('a', DEVINFO)
+    clock[0] += 299
+    assert cache.get('a') == DEVINFO
+    clock[0] += 1
+    assert cache.get('a') is None
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+    assert 'a' not in cache.entries
+
+
+def test_error_responses_use_negative_ttl(clock):
+    cache = DevInfoCache(ttl = 300, negative_ttl = 30)
+    cache.put('bad', ERROR)
+    clock[0] += 29
+    assert cache.get('bad') == ERROR
+    assert cache.stats['negative_hits'] == 1
+    clock[0] += 1
+    assert cache.get('bad') is None
+
+
+def test_evicts_least_recently_used(clock):
+    cache = DevInfoCache(maxsize = 2)
+    cache.put('a', DEVINFO)
+    cache.put('b', DEVINFO)
+    assert cache.get('a') == DEVINFO    # b is now the least recently used
+    cache.put('c', DEVINFO)
+    assert cache.get('b') is None
+    assert cache.get('a') == DEVINFO
+    assert cache.get('c') == DEVINFO
+    assert cache.stats['evictions'] == 1
+
+
+def test_put_again_refreshes_ttl_and_recency(clock):
+    cache = DevInfoCache(maxsize = 2, ttl = 10)
+    cache.put('a', DEVINFO)
+    cache.put('b', DEVINFO)
+    clock[0] += 5
+    cache.put('a', DEVINFO)
+    cache.put('c', DEVINFO)
+    assert list(cache.entries) == ['a', 'c']
+    clock[0] += 9
+    assert cache.get('a') == DEVINFO
+
+
+def test_invalidate(clock):
+    cache = DevInfoCache()
+    cache.put('a', DEVINFO)
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.get('a') is None
+    assert cache.stats['invalidations'] == 1
@@ -0,0 +1,55 @@
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'trpc'))
+from framing import FrameDecoder, encode_frame
+
+BODIES = [b'', b'x', b'{"in": "ping"}', bytes(range(256)) * 40, b'y' * 5000]
+STREAM = b''.join(encode_frame(body) for body in BODIES)
+
+
+def feed_in_chunks(decoder, data, sizes):
+    frames = []
+    pos = 0
+    for size in sizes:
+        decoder.feed(data[pos:pos + size])
+        pos += size
+        frames.extend(decoder)
+    return frames
+
+
+@pytest.mark.parametrize('chunk', [1, 2, 3, 4, 5, 7, 4096, len(STREAM)])
+def test_fixed_chunks(chunk):
+    decoder = FrameDecoder(size=16)
+    frames = feed_in_chunks(decoder, STREAM, [chunk] * (len(STREAM) // chunk + 1))
+    assert frames == BODIES
+    assert len(decoder) == 0
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_chunks(seed):
+    rand = random.Random(seed)
+    data = STREAM * 3
+    sizes = []
+    while sum(sizes) < len(data):
+        sizes.append(rand.randint(1, 600))
+    decoder = FrameDecoder(size=64)
+    assert feed_in_chunks(decoder, data, sizes) == BODIES * 3
+
+
+def test_half_frame_survives_compaction():
+    # more than half of the buffer is consumed, the half frame moves to the front instead of growing
+    decoder = FrameDecoder(size=64)
+    first, second = encode_frame(b'a' * 40), encode_frame(b'b' * 30)
+    decoder.feed(first + second[:10])
+    assert decoder.next_frame() == b'a' * 40
+    assert decoder.next_frame() is None
+    assert decoder.rpos == 44
+    decoder.feed(second[10:] + encode_frame(b'c' * 20))
+    assert decoder.rpos == 0
+    assert list(decoder) == [b'b' * 30, b'c' * 20]
+    assert len(decoder.buf) == 64
+    assert decoder.rpos == decoder.wpos == 0
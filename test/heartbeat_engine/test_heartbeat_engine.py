@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import types
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'mini-project',
+                                'new_server_push', 'websocket_server_push', 'prod'))
+# common_error ships with the device image, not with this repo
+sys.modules.setdefault('common_error', types.SimpleNamespace(OPTION_HTTP_BODY='body'))
+from heartbeat_engine import HeartbeatEngine
+
+
+class Plugins(object):
+    # stands in for PluginRegistry: 'broken' is listed but failed to import
+    def __init__(self, modules, broken=()):
+        self.modules = modules
+        self.broken = list(broken)
+
+    def __iter__(self):
+        return iter(list(self.modules) + self.broken)
+
+    def __contains__(self, name):
+        return name in self.modules or name in self.broken
+
+    def __getitem__(self, name):
+        return self.modules[name]
+
+
+class Transport(object):
+    def __init__(self, resp):
+        self.resp = resp
+        self.sent = []
+
+    async def send(self, data, header_list=()):
+        self.sent.append(data)
+        return self.resp
+
+    async def close(self):
+        pass
+
+
+def good_plugin(handled):
+    return types.SimpleNamespace(get_api_request=lambda: [{'api': 'status', 'param': 1}],
+                                 resp_handler=handled.append,
+                                 offline_handler=lambda: handled.append('offline'))
+
+
+def test_missing_plugin_and_method_do_not_abort_the_beat():
+    handled = []
+    no_offline = types.SimpleNamespace(get_api_request=lambda: [], resp_handler=handled.append)
+    plugins = Plugins({'good': good_plugin(handled), 'no_offline': no_offline}, broken=['broken'])
+    body = json.dumps({'good': 'ok', 'broken': 'x'})
+    transport = Transport({'error_code': 0, 'body': body})
+    engine = HeartbeatEngine(plugins, transport, interval=1)
+
+    async def run():
+        assert await engine.beat() is True
+        assert await engine.beat() is True
+
+    asyncio.run(run())
+    assert transport.sent[0] == {'content': {'good': [{'api': 'status', 'param': 1}], 'no_offline': [], 'broken': None}}
+    assert handled == ['ok', 'ok']
+    assert engine.busy == set()
+
+
+def test_offline_handlers_skip_plugins_without_the_method():
+    handled = []
+    no_offline = types.SimpleNamespace(get_api_request=lambda: [], resp_handler=handled.append)
+    plugins = Plugins({'good': good_plugin(handled), 'no_offline': no_offline}, broken=['broken'])
+    engine = HeartbeatEngine(plugins, Transport({'error_code': 25, 'body': None}), interval=1)
+    assert asyncio.run(engine.beat()) is False
+    assert handled == ['offline']
+    assert engine.busy == set()
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import socket
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'mini-project',
+                                'new_server_push', 'websocket_server_push', 'prod'))
+import http_pool
+
+
+class Server(object):
+    # keep-alive HTTP/1.1 server; the n-th connection answers answers[n] requests (the last
+    # count for the rest), then closes without telling the client (close) or stops answering (hang)
+    def __init__(self, answers, then):
+        self.answers = list(answers)
+        self.then = then
+        self.requests = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.url = 'http://127.0.0.1:%d/x' % self.sock.getsockname()[1]
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        while True:
+            conn = self.sock.accept()[0]
+            answers = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+            thread = threading.Thread(target=self.handle, args=(conn, answers))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, conn, answers):
+        f = conn.makefile('rb')
+        served = 0
+        while True:
+            if not f.readline():
+                break
+            length = 0
+            for line in iter(f.readline, b'\r\n'):
+                if line.lower().startswith(b'content-length'):
+                    length = int(line.split(b':')[1])
+            self.requests.append(f.read(length))
+            if served == answers:   # a hanging server stops answering, answers=0 drops the request
+                if self.then == 'hang':
+                    time.sleep(2)
+                break
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            served += 1
+            if served == answers and self.then == 'close':
+                break
+        f.close()
+        conn.close()
+
+
+def test_stale_keepalive_retried_on_new_connection():
+    server = Server([1], 'close')
+    pool = http_pool.ConnectionPool()
+    assert pool.request('POST', server.url, 'a') == b'ok'
+    time.sleep(0.2)     # the server has closed the idle connection by now
+    assert pool.request('POST', server.url, 'b') == b'ok'
+    assert server.requests == [b'a', b'b']
+    assert pool.stats['created'] == 2
+    assert pool.stats['reused'] == 1
+
+
+def test_retried_only_once():
+    # the new connection is dropped too: that error goes to the caller
+    server = Server([1, 0], 'close')
+    pool = http_pool.ConnectionPool()
+    pool.request('POST', server.url, 'a')
+    time.sleep(0.2)
+    with pytest.raises((http_pool.http_client.HTTPException, socket.error)):
+        pool.request('POST', server.url, 'b')
+    assert server.requests == [b'a', b'b']
+    assert pool.stats['created'] == 2
+
+
+def test_timeout_not_resent():
+    server = Server([1], 'hang')
+    pool = http_pool.ConnectionPool()
+    pool.request('POST', server.url, 'a')
+    with pytest.raises(socket.timeout):
+        pool.request('POST', server.url, 'b', timeout = 0.5)
+    time.sleep(0.2)
+    assert server.requests == [b'a', b'b']
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'trpc', 'grpc_examples'))
+from pi_cache import PiSeries, partial_sum
+
+
+@pytest.mark.parametrize('n', [0, -1, -5, -100000])
+def test_non_positive_cold(n):
+    assert PiSeries()(n) == 0.0
+
+
+@pytest.mark.parametrize('n', [0, -1, -5, -100000])
+def test_non_positive_warm(n):
+    series = PiSeries()
+    series(100000)
+    assert series(n) == 0.0
+    assert series(5) == partial_sum(0, 5)[0]
+
+
+def test_matches_loop_after_warm_cache():
+    series = PiSeries()
+    series(100000)
+    for n in (1, 4095, 4096, 4097, 50000, 100001):
+        assert series(n) == pytest.approx(partial_sum(0, n)[0], rel=1e-12)
@@ -0,0 +1,31 @@
+import os
+import sys
+import string
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'mini-project',
+                                'new_server_push', 'websocket_server_push', 'prod'))
+from prefix_token import rand_token
+
+
+@pytest.mark.parametrize('length', [0, 1, 8, 32, 1000])
+def test_length_and_alphabet(length):
+    token = rand_token(length)
+    assert len(token) == length
+    assert set(token) <= set(string.ascii_letters + string.digits)
+
+
+def test_unique():
+    # 62^8 ~ 2.2e14 ids, 200k draws collide with probability ~1e-4
+    tokens = [rand_token(8) for _ in range(200000)]
+    assert len(set(tokens)) == len(tokens)
+
+
+def test_uniform():
+    counts = Counter(rand_token(62 * 1000))
+    assert len(counts) == 62
+    # each char expects 1000 hits, sd ~31; a modulo bias over 256 would show up as ~+25%
+    assert min(counts.values()) > 850
+    assert max(counts.values()) < 1150
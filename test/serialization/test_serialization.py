@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'trpc'))
+from framing import HEADER, CODEC_SHIFT, LENGTH_MASK, FrameDecoder, pack_header
+from serialization import CODECS, JSON, PICKLE, get_codec
+
+MESSAGE = {'in': 'pi', 'params': [1000, 'x'], 'id': 7}
+
+
+def frame(obj, codec):
+    buffers = codec.encode(obj)
+    body = b''.join(bytes(buf) for buf in buffers)
+    return pack_header(len(body), codec.id) + body
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS.values(), key=lambda codec: codec.id), ids=lambda codec: codec.name)
+def test_round_trip(codec):
+    data = frame(MESSAGE, codec)
+    word, = HEADER.unpack_from(data)
+    assert word >> CODEC_SHIFT == codec.id
+    assert word & LENGTH_MASK == len(data) - HEADER.size
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    codec_id, body = decoder.next_message()
+    assert codec_id == codec.id
+    assert CODECS[codec_id].decode(body) == MESSAGE
+
+
+def test_pickle_out_of_band_buffers():
+    codec = get_codec('pickle')
+    blob = bytes(range(256)) * 1024
+    decoder = FrameDecoder()
+    decoder.feed(frame({'data': blob, 'small': b'abc'}, codec))
+    codec_id, body = decoder.next_message()
+    assert codec_id == PICKLE
+    assert CODECS[codec_id].decode(body) == {'data': blob, 'small': b'abc'}
+
+
+def test_json_frames_keep_old_header():
+    assert pack_header(10, JSON) == HEADER.pack(10)
+
+
+def test_frame_over_size_cap_rejected():
+    assert LENGTH_MASK == 16 * 1024 * 1024 - 1
+    pack_header(LENGTH_MASK)
+    with pytest.raises(ValueError):
+        pack_header(LENGTH_MASK + 1)
+    with pytest.raises(ValueError):
+        pack_header(LENGTH_MASK + 1, PICKLE)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+    with pytest.raises(ValueError):
+        get_codec(99)
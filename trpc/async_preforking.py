@@ -6,18 +6,23 @@ import json
 import struct
 import socket
 import asyncore
-from cStringIO import StringIO
 
+from framing import FrameDecoder
+from sendq import dispatcher_with_sendq, write_queue_stats
+from sampling import log_sampled
 
-class RPCHandler(asyncore.dispatcher_with_send):
+
+class RPCHandler(dispatcher_with_sendq):
 
     def __init__(self, sock, addr):
-        asyncore.dispatcher_with_send.__init__(self, sock=sock)
+        dispatcher_with_sendq.__init__(self, sock=sock)
         self.addr = addr
         self.handlers = {
-            "ping": self.ping
+            "ping": self.ping,
+            "__stats__": self.stats,  # 保留方法：本进程各连接的发送队列
         }
-        self.rbuf = StringIO()  # 读缓冲
+        self.request_id = None
+        self.rbuf = FrameDecoder()  # 读缓冲
 
     def handle_connect(self):
         print self.addr, 'comes'
@@ -30,41 +35,34 @@ class RPCHandler(asyncore.dispatcher_with_send):
         while True:
             content = self.recv(1024)
             if content:
-                self.rbuf.write(content)  # 追加到读缓冲
+                self.rbuf.feed(content)  # 追加到读缓冲
             if len(content) < 1024:  # 说明内核缓冲区空了，等待下个事件循环再继续读吧
                 break
         self.handle_rpc()  # 处理新读到的消息
 
     def handle_rpc(self):
-        while True:
-            self.rbuf.seek(0)
-            length_prefix = self.rbuf.read(4)
-            if len(length_prefix) < 4:  # 半包
-                break
-            length, = struct.unpack("I", length_prefix)
-            body = self.rbuf.read(length)
-            if len(body) < length:  # 还是半包
-                break
+        for body in self.rbuf:  # 半包时迭代结束，等待下次读事件
             request = json.loads(body)
             in_ = request['in']
             params = request['params']
-            print os.getpid(), in_, params
+            self.request_id = request.get('id')  # 按顺序处理，响应原样带回 id
+            log_sampled(os.getpid(), in_, params)
             handler = self.handlers[in_]
             handler(params) # 处理RPC
-            left = self.rbuf.getvalue()[length + 4:]  # 截断读缓冲
-            self.rbuf = StringIO()
-            self.rbuf.write(left)
-        self.rbuf.seek(0, 2)  # 移动游标到缓冲区末尾，便于后续内容直接追加
 
     def ping(self, params):
         self.send_result("pong", params)
 
+    def stats(self, params):
+        self.send_result("stats", {"pid": os.getpid(), "write_queues": write_queue_stats()})
+
     def send_result(self, out, result):
         response = {"out": out, "result": result}
+        if self.request_id is not None:
+            response["id"] = self.request_id
         body = json.dumps(response)
         length_prefix = struct.pack("I", len(body))
-        self.send(length_prefix)
-        self.send(body)
+        self.sendv([length_prefix, body])  # 头和消息体一起排队，不拼接，有 sendmsg 时一次写出
 
 
 class RPCServer(asyncore.dispatcher):
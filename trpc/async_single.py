@@ -1,22 +1,28 @@
 # coding: utf8
 # Python 2.x
 
+import os
 import json
 import struct
 import socket
 import asyncore
-from cStringIO import StringIO
 
+from framing import FrameDecoder
+from sendq import dispatcher_with_sendq, write_queue_stats
+from sampling import log_sampled
 
-class RPCHandler(asyncore.dispatcher_with_send):  # 客户套接字处理器必须继承dispatcher_with_send
+
+class RPCHandler(dispatcher_with_sendq):  # 客户套接字处理器继承带发送队列的dispatcher，见sendq.py
 
     def __init__(self, sock, addr):
-        asyncore.dispatcher_with_send.__init__(self, sock=sock)
+        dispatcher_with_sendq.__init__(self, sock=sock)
         self.addr = addr
         self.handlers = {
-            "ping": self.ping
+            "ping": self.ping,
+            "__stats__": self.stats,  # 保留方法：本进程各连接的发送队列
         }
-        self.rbuf = StringIO()  # 读缓冲区由用户代码维护，写缓冲区由asyncore内部提供
+        self.request_id = None
+        self.rbuf = FrameDecoder()  # 读缓冲区由用户代码维护，写缓冲区由asyncore内部提供
 
     def handle_connect(self):  # 新的连接被accept后回调方法
         print self.addr, 'comes'
@@ -29,41 +35,34 @@ class RPCHandler(asyncore.dispatcher_with_send):  # 客户套接字处理器必
         while True:
             content = self.recv(1024)
             if content:
-                self.rbuf.write(content)
+                self.rbuf.feed(content)
             if len(content) < 1024:
                 break
         self.handle_rpc()
 
     def handle_rpc(self):  # 将读到的消息解包并处理
-        while True:  # 可能一次性收到了多个请求消息，所以需要循环处理
-            self.rbuf.seek(0)
-            length_prefix = self.rbuf.read(4)
-            if len(length_prefix) < 4:  # 不足一个消息
-                break
-            length, = struct.unpack("I", length_prefix)
-            body = self.rbuf.read(length)
-            if len(body) < length:  # 不足一个消息
-                break
+        for body in self.rbuf:  # 可能一次性收到了多个请求消息，所以需要循环处理；不足一个消息时迭代结束
             request = json.loads(body)
             in_ = request['in']
             params = request['params']
-            print in_, params
+            self.request_id = request.get('id')  # 按顺序处理，响应原样带回 id
+            log_sampled(in_, params)
             handler = self.handlers[in_]
-            handler(params)  # 处理消息
-            left = self.rbuf.getvalue()[length + 4:]  # 消息处理完了，缓冲区要截断
-            self.rbuf = StringIO()
-            self.rbuf.write(left)
-        self.rbuf.seek(0, 2)  # 将游标挪到文件结尾，以便后续读到的内容直接追加
+            handler(params)  # 处理消息，缓冲区游标已前移，无需截断
 
     def ping(self, params):
         self.send_result("pong", params)
 
+    def stats(self, params):
+        self.send_result("stats", {"pid": os.getpid(), "write_queues": write_queue_stats()})
+
     def send_result(self, out, result):
         response = {"out": out, "result": result}
+        if self.request_id is not None:
+            response["id"] = self.request_id
         body = json.dumps(response)
         length_prefix = struct.pack("I", len(body))
-        self.send(length_prefix)  # 写入缓冲区
-        self.send(body) # 写入缓冲区
+        self.sendv([length_prefix, body])  # 头和消息体一起排队，不拼接，有 sendmsg 时一次写出
 
 
 class RPCServer(asyncore.dispatcher):  # 服务器套接字处理器必须继承dispatcher
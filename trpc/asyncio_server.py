@@ -0,0 +1,238 @@
+# coding: utf8
+# Python 3.x
+# 基于 asyncio streams 的 RPC 服务器，协议与 async_single.py 相同：4字节长度前缀 + JSON
+# 长度前缀高8位可以指定其他编码方式（serialization.py），响应使用与请求相同的编码
+
+import os
+import sys
+import asyncio
+import argparse
+import contextvars
+
+from framing import HEADER, CODEC_SHIFT, LENGTH_MASK, pack_header
+from executors import Executors, INLINE
+from metrics import Metrics, serve_prometheus
+from sampling import log_sampled
+from serialization import CODECS, JSON, MSGPACK, PICKLE
+
+# 当前请求的 id，每个请求跑在自己的 task 里，互不干扰；没有 id 的老客户端只能按顺序匹配响应
+request_id = contextvars.ContextVar("request_id", default=None)
+request_codec = contextvars.ContextVar("request_codec", default=CODECS[JSON])
+
+# pickle 能执行任意代码，默认不接受
+DEFAULT_CODECS = frozenset(codec for codec in (JSON, MSGPACK) if codec in CODECS)
+
+
+def loop_policy(name="auto"):
+    # auto: 装了 uvloop 就用 uvloop，否则退回标准事件循环
+    if name in ("auto", "uvloop"):
+        try:
+            import uvloop
+        except ImportError:
+            if name == "uvloop":
+                raise
+        else:
+            return uvloop.EventLoopPolicy()
+    if name in ("auto", "asyncio"):
+        return asyncio.DefaultEventLoopPolicy()
+    raise ValueError("unknown loop policy: %r" % name)
+
+
+class RPCHandler(object):
+    # 默认只有 ping 和 __stats__；其他方法在子类里往 self.handlers 加，通过 RPCServer(handler_class=...) 使用，
+    # 压测用的 sleep/blocking_sleep/pi 见 bench_handlers.py
+
+    high_watermark = 256 * 1024
+    low_watermark = 64 * 1024
+
+    def __init__(self, reader, writer, max_inflight=64, codecs=DEFAULT_CODECS, executors=None, server=None):
+        self.reader = reader
+        self.writer = writer
+        self.server = server
+        self.metrics = server.metrics if server is not None else Metrics()
+        writer.transport.set_write_buffer_limits(high=self.high_watermark, low=self.low_watermark)
+        self.peak_queued_bytes = 0
+        self.codecs = codecs
+        self.executors = executors if executors is not None else Executors()
+        self.addr = writer.get_extra_info("peername")
+        self.handlers = {
+            "ping": self.ping,
+            "__stats__": self.stats,  # 保留方法：所有 worker 汇总后的统计
+        }
+        self.inflight = asyncio.Semaphore(max_inflight)  # 单连接并发请求上限
+        self.tasks = set()
+
+    async def handle(self):
+        print(self.addr, 'comes')
+        try:
+            while True:
+                # 响应积压超过高水位时先不读新请求，等降到低水位
+                await self.writer.drain()
+                length_prefix = await self.reader.readexactly(HEADER.size)
+                word, = HEADER.unpack(length_prefix)
+                codec = word >> CODEC_SHIFT
+                body = await self.reader.readexactly(word & LENGTH_MASK)
+                if codec not in self.codecs:
+                    print(self.addr, 'unsupported codec', codec)
+                    break
+                await self.inflight.acquire()
+                task = asyncio.ensure_future(self.handle_rpc(CODECS[codec], body))  # 不等待结果，继续读下一个请求
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # 服务器关闭时连接任务被取消，和客户端断开一样正常收尾，不打印堆栈
+        finally:
+            print(self.addr, 'bye')
+            for task in self.tasks:
+                task.cancel()
+            self.writer.close()
+
+    async def handle_rpc(self, codec, body):
+        token = None
+        try:
+            request_codec.set(codec)
+            request = codec.decode(body)
+            in_ = request['in']
+            params = request['params']
+            request_id.set(request.get('id'))
+            handler = self.handlers.get(in_)
+            token = self.metrics.begin(in_ if handler is not None else "__unknown__")
+            if handler is None:
+                raise KeyError(in_)
+            log_sampled(os.getpid(), in_, params)
+            result = handler(params)
+            if asyncio.iscoroutine(result):  # 同步、异步处理函数都支持
+                await result
+            self.metrics.end(token)
+        except asyncio.CancelledError:
+            if token is not None:
+                self.metrics.end(token, error=True)
+            self.inflight.release()
+            raise
+        except Exception as e:
+            self.metrics.end(token if token is not None else self.metrics.begin("__bad_request__"), error=True)
+            self.send_result("error", "%s: %s" % (type(e).__name__, e))  # 告诉客户端出错了，免得一直等
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.inflight.release()
+
+    def ping(self, params):
+        self.send_result("pong", params)
+
+    def stats(self, params):
+        stats = {"pid": os.getpid(), "methods": self.metrics.snapshot()}
+        if self.server is not None:
+            stats["write_queues"] = self.server.write_queue_stats()  # 只有本进程的连接
+        self.send_result("stats", stats)
+
+    def offload(self, out, fn, policy=INLINE):
+        # fn(params) 返回结果，由事件循环写回发起请求的连接
+        async def handler(params):
+            self.send_result(out, await self.executors.run(policy, fn, params))
+        return handler
+
+    def send_result(self, out, result):
+        response = {"out": out, "result": result}
+        id_ = request_id.get()
+        if id_ is not None:
+            response["id"] = id_
+        codec = request_codec.get()
+        buffers = codec.encode(response)
+        header = pack_header(sum(len(buf) for buf in buffers), codec.id)
+        self.writer.writelines([header] + buffers)  # 一次写入，并发响应之间不会交错；3.12起走 sendmsg
+        self.peak_queued_bytes = max(self.peak_queued_bytes, self.queued_bytes)
+
+    @property
+    def queued_bytes(self):
+        return self.writer.transport.get_write_buffer_size()
+
+
+class RPCServer(object):
+
+    def __init__(self, host, port, handler_class=RPCHandler, backlog=1024, codecs=DEFAULT_CODECS,
+                 executors=None, metrics=None):
+        self.host = host
+        self.port = port
+        self.handler_class = handler_class
+        self.backlog = backlog
+        self.codecs = codecs
+        self.executors = executors if executors is not None else Executors()  # 所有连接共用
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.server = None
+        self.conns = set()
+
+    async def on_connect(self, reader, writer):
+        handler = self.handler_class(reader, writer, codecs=self.codecs, executors=self.executors, server=self)
+        self.conns.add(handler)
+        try:
+            await handler.handle()
+        finally:
+            self.conns.discard(handler)
+
+    async def start(self, sock=None, **kwargs):
+        if sock is not None:  # 已经绑定好的套接字，例如 SO_REUSEPORT
+            kwargs["sock"] = sock
+        else:
+            kwargs.update(host=self.host, port=self.port)
+        self.server = await asyncio.start_server(
+            self.on_connect, backlog=self.backlog, **kwargs)
+        return self.server
+
+    async def drain(self, timeout=10.0):
+        # 停止accept，等待处理中的请求写完响应，然后关闭所有连接
+        self.server.close()
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while any(conn.tasks for conn in self.conns) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for conn in list(self.conns):
+            conn.writer.close()
+        self.executors.shutdown(wait=False)
+
+    def write_queue_stats(self):
+        # 每个连接排队待发送的字节数
+        return dict((repr(conn.addr), {
+            "queued_bytes": conn.queued_bytes,
+            "peak_queued_bytes": conn.peak_queued_bytes,
+        }) for conn in self.conns)
+
+    async def serve_forever(self, metrics_port=None, **kwargs):
+        server = await self.start(**kwargs)
+        if metrics_port:
+            await serve_prometheus(self.metrics, self.host, metrics_port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="192.168.1.195")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--loop", default="auto", choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--allow-pickle", action="store_true")
+    parser.add_argument("--threads", type=int, default=32, help="thread pool size for blocking handlers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="process pool size for CPU-bound handlers")
+    parser.add_argument("--queue-size", type=int, help="extra queued calls per pool before callers wait")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus text metrics on this port")
+    parser.add_argument("--bench-handlers", action="store_true", help="also serve sleep/blocking_sleep/pi for benchmarks")
+    args = parser.parse_args(argv)
+    asyncio.set_event_loop_policy(loop_policy(args.loop))
+    codecs = DEFAULT_CODECS | {PICKLE} if args.allow_pickle else DEFAULT_CODECS
+    executors = Executors(args.threads, args.processes, args.queue_size)
+    handler_class = RPCHandler
+    if args.bench_handlers:
+        from bench_handlers import BenchHandler as handler_class
+    try:
+        asyncio.run(RPCServer(args.host, args.port, handler_class=handler_class, codecs=codecs, executors=executors)
+                    .serve_forever(metrics_port=args.metrics_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,204 @@
+# coding: utf8
+# Python 3.x
+# 压测工具：在本机拉起指定的服务器，多进程 × 多连接 × 流水线深度 发 ping，统计 req/s 和延迟分位数
+#   python bench.py --server asyncio_server --connections 32 --depth 8 --payload 64 --duration 10
+#   python bench.py --server async_single --python2 python2 --json async_single.json
+#   python bench.py --target 127.0.0.1:8080      # 压一个已经在运行的服务器
+# 结果可以用 --json 导出，对比不同实现或不同版本
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+
+from histogram import Histogram
+from mux_client import MuxClient
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+ASYNCORE_SERVER = "import asyncore, {module} as m; m.RPCServer({host!r}, {port}); asyncore.loop()"
+BLOCKING_SERVER = """
+import socket, preforking as m
+sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+sock.bind(({host!r}, {port}))
+sock.listen(128)
+m.prefork({workers})
+m.loop(sock, {{"ping": m.ping}})
+"""
+
+# 服务器名 -> 生成启动命令的函数；新的服务器实现在这里登记即可
+SERVERS = {
+    "async_single": lambda args, port: [
+        args.python2, "-c", ASYNCORE_SERVER.format(module="async_single", host=args.host, port=port)],
+    "async_preforking": lambda args, port: [
+        args.python2, "-c", ASYNCORE_SERVER.format(module="async_preforking", host=args.host, port=port)],
+    "preforking": lambda args, port: [
+        sys.executable, "-c", BLOCKING_SERVER.format(host=args.host, port=port, workers=args.workers)],
+    "asyncio_server": lambda args, port: [
+        sys.executable, "asyncio_server.py", "--host", args.host, "--port", str(port)],
+    "reuseport": lambda args, port: [
+        sys.executable, "reuseport.py", "--host", args.host, "--port", str(port),
+        "--workers", str(args.workers)],
+}
+
+
+def free_port(host):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((host, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(args, port):
+    proc = subprocess.Popen(SERVERS[args.server](args, port), cwd=HERE, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server %s exited with %s" % (args.server, proc.returncode))
+        try:
+            socket.create_connection((args.host, port), 0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError("server %s did not start listening" % args.server)
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+async def drive(client, payload, timeout, stop_at, measure_from, hist, stats):
+    # 一个“流水线槽位”：收到响应立刻发下一个请求；出错计数后继续发，吞吐下降会体现在 errors 里
+    while True:
+        start = time.perf_counter()
+        if start >= stop_at:
+            return
+        try:
+            await asyncio.wait_for(client.call("ping", payload), timeout)
+        except Exception as e:  # 超时也算错误，例如阻塞服务器的进程数少于连接数
+            stats["errors"] += 1
+            if client.closed:  # 连接断了，再发只会立刻失败，整个压测中止
+                raise RuntimeError("connection closed by server after %d requests: %r" % (stats["requests"], e))
+            continue
+        end = time.perf_counter()
+        if start >= measure_from:  # 预热阶段不计入
+            hist.record((end - start) * 1e6)
+            stats["requests"] += 1
+
+
+async def run_client(host, port, connections, depth, payload, timeout, warmup, duration):
+    hist = Histogram()
+    stats = {"requests": 0, "errors": 0}
+    clients = [await MuxClient.connect(host, port) for _ in range(connections)]
+    now = time.perf_counter()
+    measure_from = now + warmup
+    stop_at = measure_from + duration
+    await asyncio.gather(*[drive(client, payload, timeout, stop_at, measure_from, hist, stats)
+                           for client in clients for _ in range(depth)])
+    for client in clients:
+        await client.close()
+    return stats, hist.counts
+
+
+def client_process(job):
+    return asyncio.run(run_client(*job))
+
+
+def run(args, host, port):
+    per_proc = [args.connections // args.procs + (i < args.connections % args.procs) for i in range(args.procs)]
+    payload = "x" * args.payload
+    jobs = [(host, port, n, args.depth, payload, args.timeout, args.warmup, args.duration) for n in per_proc if n]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = pool.map(client_process, jobs)
+    hist = Histogram()
+    requests = errors = 0
+    for stats, counts in results:
+        hist.merge(Histogram(counts=counts))
+        requests += stats["requests"]
+        errors += stats["errors"]
+    return {
+        "server": args.server or "%s:%d" % (host, port),
+        "connections": args.connections,
+        "depth": args.depth,
+        "payload": args.payload,
+        "procs": args.procs,
+        "duration": args.duration,
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / args.duration,
+        "latency_us": {
+            "mean": round(hist.mean(), 1),
+            "p50": hist.percentile(50),
+            "p99": hist.percentile(99),
+            "p999": hist.percentile(99.9),
+            "max": hist.percentile(100),
+        },
+        "histogram": hist.to_dict(),
+    }
+
+
+def report(result):
+    latency = result["latency_us"]
+    print("%s  conns=%d depth=%d payload=%dB procs=%d" % (
+        result["server"], result["connections"], result["depth"], result["payload"], result["procs"]))
+    print("  %d requests, %d errors, %.0f req/s" % (result["requests"], result["errors"], result["rps"]))
+    print("  latency us: mean %.0f  p50 %d  p99 %d  p999 %d  max %d" % (
+        latency["mean"], latency["p50"], latency["p99"], latency["p999"], latency["max"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--server", choices=sorted(SERVERS))
+    group.add_argument("--target", help="host:port of a running server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--depth", type=int, default=1, help="outstanding requests per connection")
+    parser.add_argument("--payload", type=int, default=16, help="ping params size in bytes")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=5.0, help="per request timeout")
+    parser.add_argument("--procs", type=int, default=os.cpu_count(), help="load generator processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="server processes when applicable")
+    parser.add_argument("--python2", default="python2", help="interpreter for the asyncore servers")
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--verbose", action="store_true", help="show server stderr")
+    args = parser.parse_args(argv)
+    args.procs = max(1, min(args.procs, args.connections))
+
+    try:
+        if args.target:
+            host, port = args.target.rsplit(":", 1)
+            result = run(args, host, int(port))
+        else:
+            port = free_port(args.host)
+            proc = start_server(args, port)
+            try:
+                result = run(args, args.host, port)
+            finally:
+                stop_server(proc)
+    except RuntimeError as e:
+        sys.exit("bench aborted: %s" % e)
+
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,49 @@
+# coding: utf8
+# 对比各编码方式在小消息和 1MB 消息上的 编码+解码 耗时
+# python bench_codecs.py
+
+import os
+import time
+import base64
+
+from serialization import CODECS, JSON
+
+
+def payloads():
+    blob = os.urandom(1024 * 1024)
+    yield "small", {"in": "ping", "params": {"id": 42, "name": "device-01", "tags": ["a", "b"]}}
+    yield "1MB text", {"in": "ping", "params": "x" * (1024 * 1024)}
+    yield "1MB blob", {"in": "upload", "params": {"name": "fw.bin", "data": blob}}
+
+
+def round_trip(codec, message):
+    buffers = codec.encode(message)
+    body = b"".join(buffers)  # 模拟接收端拿到的连续消息体
+    codec.decode(body)
+    return sum(len(buf) for buf in buffers)
+
+
+def bench(codec, message, seconds=0.5):
+    if codec.id == JSON and isinstance(message["params"], dict) and "data" in message["params"]:
+        # JSON 不支持二进制，按常见做法先 base64
+        params = dict(message["params"], data=base64.b64encode(message["params"]["data"]).decode())
+        message = dict(message, params=params)
+    size = round_trip(codec, message)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        round_trip(codec, message)
+        count += 1
+    return size, (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    print("%-10s %-8s %12s %14s" % ("payload", "codec", "bytes", "us/round-trip"))
+    for label, message in payloads():
+        for codec in CODECS.values():
+            size, cost = bench(codec, message)
+            print("%-10s %-8s %12d %14.1f" % (label, codec.name, size, cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# coding: utf8
+# 对比旧的 StringIO 截断解包 与 FrameDecoder 在不同流水线深度下的单消息开销
+# python bench_framing.py
+
+import io
+import json
+import struct
+import time
+
+from framing import FrameDecoder, encode_frame
+
+
+def legacy_decode(burst, chunk):
+    # 等价于 async_single.RPCHandler.handle_read/handle_rpc 的旧实现
+    rbuf = io.BytesIO()
+    count = 0
+    for i in range(0, len(burst), chunk):
+        rbuf.write(burst[i:i + chunk])
+        while True:
+            rbuf.seek(0)
+            length_prefix = rbuf.read(4)
+            if len(length_prefix) < 4:
+                break
+            length, = struct.unpack("I", length_prefix)
+            body = rbuf.read(length)
+            if len(body) < length:
+                break
+            count += 1
+            left = rbuf.getvalue()[length + 4:]
+            rbuf = io.BytesIO()
+            rbuf.write(left)
+        rbuf.seek(0, 2)
+    return count
+
+
+def decoder_decode(burst, chunk):
+    rbuf = FrameDecoder()
+    count = 0
+    for i in range(0, len(burst), chunk):
+        rbuf.feed(burst[i:i + chunk])
+        for _ in rbuf:
+            count += 1
+    return count
+
+
+def bench(fn, depth, chunk=65536, rounds=5):
+    body = json.dumps({"in": "ping", "params": "x" * 32}).encode()
+    burst = encode_frame(body) * depth
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        assert fn(burst, chunk) == depth
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    return best / depth * 1e9
+
+
+def main():
+    print("%8s %16s %16s" % ("depth", "legacy ns/msg", "decoder ns/msg"))
+    for depth in (1, 10, 100, 1000, 10000):
+        print("%8d %16.0f %16.0f" % (depth, bench(legacy_decode, depth), bench(decoder_decode, depth)))
+
+
+if __name__ == '__main__':
+    main()
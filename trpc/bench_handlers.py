@@ -0,0 +1,39 @@
+# coding: utf8
+# Python 3.x
+# 压测和演示用的处理函数，服务器默认不提供；asyncio_server.py / reuseport.py 加 --bench-handlers 才注册
+#   sleep           异步处理函数，先到的请求可能后返回
+#   blocking_sleep  阻塞调用，放到线程池里跑
+#   pi              CPU 密集，放到进程池里跑
+
+import time
+import asyncio
+
+from asyncio_server import RPCHandler
+from executors import THREAD, PROCESS
+
+
+def calc_pi(n):
+    s = 0.0
+    for i in range(n):
+        s += 1.0 / (2*i+1) / (2*i+1)
+    return (8*s) ** 0.5
+
+
+def blocking_sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class BenchHandler(RPCHandler):
+
+    def __init__(self, *args, **kwargs):
+        RPCHandler.__init__(self, *args, **kwargs)
+        self.handlers.update({
+            "sleep": self.sleep,
+            "blocking_sleep": self.offload("slept", blocking_sleep, THREAD),
+            "pi": self.offload("pi", calc_pi, PROCESS),
+        })
+
+    async def sleep(self, params):
+        await asyncio.sleep(params)
+        self.send_result("slept", params)
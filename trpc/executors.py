@@ -0,0 +1,54 @@
+# coding: utf8
+# Python 3.x
+# 处理函数的执行方式
+#   inline  直接在事件循环里跑，适合很快的处理函数（默认）
+#   thread  线程池，适合阻塞 I/O
+#   process 进程池，适合 CPU 密集计算，处理函数和参数必须能被 pickle
+# 每个池最多同时接收 workers + queue_size 个任务，满了之后调用方在 run() 里等待，
+# 连接的并发请求数随之占满，服务器就不再读这个连接，反压一路传给客户端
+# 池大小为 0 表示不提供这种执行方式，用到它的处理函数直接报错
+
+import os
+import asyncio
+from concurrent import futures
+
+INLINE, THREAD, PROCESS = "inline", "thread", "process"
+
+
+class Executors(object):
+
+    def __init__(self, threads=32, processes=os.cpu_count(), queue_size=None, mp_context=None):
+        self.workers = {THREAD: threads, PROCESS: processes}
+        self.limits = dict((policy, workers + (workers if queue_size is None else queue_size))
+                           for policy, workers in self.workers.items() if workers)
+        self.mp_context = mp_context  # 进程池的启动方式，已经 fork 出来的 worker 里可以用 forkserver
+        self.pools = {}
+        self.slots = {}  # policy -> (事件循环, Semaphore)
+
+    def pool(self, policy):
+        # 用到时再创建，preforking 时每个 worker 进程有自己的池
+        if policy not in self.pools:
+            if policy == THREAD:
+                self.pools[policy] = futures.ThreadPoolExecutor(self.workers[THREAD])
+            else:
+                self.pools[policy] = futures.ProcessPoolExecutor(self.workers[PROCESS], mp_context=self.mp_context)
+        return self.pools[policy]
+
+    async def run(self, policy, fn, *args):
+        if policy == INLINE:
+            return fn(*args)
+        if policy not in self.limits:
+            raise ValueError("execution policy not available: %r" % policy)
+        # 信号量在事件循环里第一次用到时才创建，换了事件循环就重建：Executors 可能在 asyncio.run
+        # 之前构造，Python 3.8/3.9 的 Semaphore 会绑定到构造时的 get_event_loop()
+        loop = asyncio.get_running_loop()
+        slots = self.slots.get(policy)
+        if slots is None or slots[0] is not loop:
+            slots = self.slots[policy] = (loop, asyncio.Semaphore(self.limits[policy]))
+        async with slots[1]:
+            return await loop.run_in_executor(self.pool(policy), fn, *args)
+
+    def shutdown(self, wait=True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+        self.pools.clear()
@@ -0,0 +1,112 @@
+# coding: utf8
+# Python 2.x / 3.x
+# 4字节长度前缀 + 消息体 的增量解包器，读缓冲是一块可复用的 bytearray
+
+import time
+import socket
+import struct
+
+HEADER = struct.Struct("I")  # 与 struct.pack("I") 保持一致
+# 长度前缀的高8位是编码方式（见 serialization.py），0 即 JSON，老客户端的帧不受影响
+CODEC_SHIFT = 24
+LENGTH_MASK = (1 << CODEC_SHIFT) - 1
+
+
+def pack_header(length, codec=0):
+    if length > LENGTH_MASK:
+        raise ValueError("frame too large: %d bytes" % length)
+    return HEADER.pack(codec << CODEC_SHIFT | length)
+
+
+def encode_frame(body, codec=0):
+    return pack_header(len(body), codec) + body
+
+
+def set_remaining_timeout(sock, deadline):
+    # Python 3.x: deadline 是整次调用的截止时间（time.monotonic()），每次 send/recv 前换成剩下的时间
+    if deadline is None:
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise socket.timeout("timed out")
+    sock.settimeout(remaining)
+
+
+def sendmsg_all(sock, buffers, deadline=None):
+    # Python 3.x: 头和消息体一次 sendmsg 分散写出，处理部分发送
+    views = [memoryview(buf).cast("B") for buf in buffers]
+    while views:
+        set_remaining_timeout(sock, deadline)
+        sent = sock.sendmsg(views[:1024])  # IOV_MAX
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+        while views and not len(views[0]):
+            views.pop(0)
+
+
+class FrameDecoder(object):
+
+    def __init__(self, size=4096, compact_ratio=0.5):
+        self.buf = bytearray(size)
+        self.rpos = 0  # 下一个未解包字节
+        self.wpos = 0  # 下一个可写位置
+        self.compact_ratio = compact_ratio
+
+    def __len__(self):
+        return self.wpos - self.rpos
+
+    def _reserve(self, n):
+        if len(self.buf) - self.wpos >= n:
+            return
+        # 只有已消费的部分占了大半个缓冲区才搬移，否则直接扩容
+        if self.rpos and self.rpos >= len(self.buf) * self.compact_ratio:
+            pending = self.wpos - self.rpos
+            self.buf[:pending] = self.buf[self.rpos:self.wpos]
+            self.rpos, self.wpos = 0, pending
+        free = len(self.buf) - self.wpos
+        if free < n:
+            self.buf.extend(bytearray(max(n - free, len(self.buf))))
+
+    def feed(self, data):
+        n = len(data)
+        self._reserve(n)
+        self.buf[self.wpos:self.wpos + n] = data
+        self.wpos += n
+
+    def recv_into(self, sock, nbytes=65536):
+        # 直接收进缓冲区尾部，省掉一次 recv() 产生的临时对象
+        self._reserve(nbytes)
+        n = sock.recv_into(memoryview(self.buf)[self.wpos:], nbytes)
+        self.wpos += n
+        return n
+
+    def next_message(self):
+        # 返回 (编码方式, 消息体)
+        if self.wpos - self.rpos < HEADER.size:  # 半包
+            return None
+        word, = HEADER.unpack_from(self.buf, self.rpos)
+        length = word & LENGTH_MASK
+        start = self.rpos + HEADER.size
+        end = start + length
+        if end > self.wpos:  # 还是半包
+            return None
+        body = memoryview(self.buf)[start:end].tobytes()
+        self.rpos = end
+        if self.rpos == self.wpos:  # 全部消费完，游标归零，无需搬移
+            self.rpos = self.wpos = 0
+        return word >> CODEC_SHIFT, body
+
+    def next_frame(self):
+        message = self.next_message()
+        return None if message is None else message[1]
+
+    def __iter__(self):
+        while True:
+            body = self.next_frame()
+            if body is None:
+                return
+            yield body
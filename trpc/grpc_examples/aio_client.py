@@ -0,0 +1,58 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+import grpc
+
+import pi_pb2
+import pi_pb2_grpc
+
+
+async def worker(client, ns, latencies):
+    for n in ns:
+        start = time.perf_counter()
+        await client.Calc(pi_pb2.PiRequest(n=n))
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(target, clients, ns):
+    # every client gets its own channel, as separate processes would
+    channels = [grpc.aio.insecure_channel(target) for _ in range(clients)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(pi_pb2_grpc.PiCalculatorStub(channel), ns[i::clients], latencies)
+                           for i, channel in enumerate(channels)])
+    elapsed = time.perf_counter() - start
+    for channel in channels:
+        await channel.close()
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="127.0.0.1:8080")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--max-n", type=int, default=100000, help="n is drawn uniformly from [0, max-n)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    ns = [rng.randrange(args.max_n) for _ in range(args.requests)]
+    result = asyncio.run(run(args.target, args.clients, ns))
+    print("%(clients)d clients: %(requests)d requests in %(elapsed).3fs, %(rps).0f req/s, "
+          "p50 %(p50_ms).2fms p99 %(p99_ms).2fms" % result)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+import os
+import sys
+import math
+import signal
+import asyncio
+import argparse
+import multiprocessing
+from concurrent import futures
+
+import grpc
+
+import pi_pb2
+import pi_pb2_grpc
+from pi_cache import PiSeries
+
+SERIES = PiSeries()  # one cache per process, pool workers build their own
+
+
+def calc(n):
+    return math.sqrt(8*SERIES(n))
+
+
+def calc_many(ns):
+    return [calc(n) for n in ns]
+
+
+class PiCalculatorServicer(pi_pb2_grpc.PiCalculatorServicer):
+
+    def __init__(self, pool=None):
+        self.pool = pool
+
+    async def run(self, fn, arg):
+        # without a pool the work runs on the event loop, which is fine for cache hits only
+        if self.pool is None:
+            return fn(arg)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, arg)
+
+    async def Calc(self, request, ctx):
+        return pi_pb2.PiResponse(value=await self.run(calc, request.n))
+
+    async def CalcBatch(self, request, ctx):
+        return pi_pb2.PiBatchResponse(value=await self.run(calc_many, list(request.n)))
+
+    async def CalcStream(self, request_iterator, ctx):
+        async for request in request_iterator:
+            yield pi_pb2.PiResponse(value=await self.run(calc, request.n))
+
+
+async def serve(args):
+    pool = None
+    if args.processes:
+        # spawn rather than fork: forking a process that already runs gRPC threads is unsafe
+        pool = futures.ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context("spawn"))
+        # start the workers now instead of on the first requests
+        await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(pool, calc, 0)
+                               for _ in range(args.processes)])
+    server = grpc.aio.server(maximum_concurrent_rpcs=args.max_concurrent_rpcs)
+    pi_pb2_grpc.add_PiCalculatorServicer_to_server(PiCalculatorServicer(pool), server)
+    server.add_insecure_port(args.address)
+    await server.start()
+    # SIGTERM stops the server gracefully so the pool workers are shut down with it
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: loop.create_task(server.stop(args.grace)))
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(args.grace)
+        if pool is not None:
+            pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", default="127.0.0.1:8080")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="process pool size for Calc, 0 runs it on the event loop")
+    parser.add_argument("--max-concurrent-rpcs", type=int, default=None,
+                        help="RPCs beyond this are rejected with RESOURCE_EXHAUSTED")
+    parser.add_argument("--grace", type=float, default=5.0)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
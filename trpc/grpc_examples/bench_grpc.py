@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import grpc
+
+import aio_client
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+SERVERS = {
+    "threads": lambda args: [sys.executable, "server.py", "--workers", str(args.workers)],
+    "aio": lambda args: [sys.executable, "aio_server.py", "--processes", "0"],
+    "aio+processes": lambda args: [sys.executable, "aio_server.py", "--processes", str(args.processes)],
+}
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(cmd, address):
+    proc = subprocess.Popen(cmd + ["--address", address], cwd=HERE, stdout=subprocess.DEVNULL)
+    channel = grpc.insecure_channel(address)
+    try:
+        grpc.channel_ready_future(channel).result(timeout=10)
+    finally:
+        channel.close()
+    return proc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["threads", "aio", "aio+processes"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-n", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=10, help="thread pool size of server.py")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    print("%-14s %8s %10s %10s %10s" % ("server", "clients", "req/s", "p50 ms", "p99 ms"))
+    for name in args.servers:
+        for clients in args.clients:
+            # fresh server per run so the prefix-sum cache starts cold every time
+            address = "127.0.0.1:%d" % free_port()
+            proc = start_server(SERVERS[name](args), address)
+            try:
+                ns = [(i * 7919) % args.max_n for i in range(args.requests)]
+                result = asyncio.run(aio_client.run(address, clients, ns))
+            finally:
+                proc.terminate()
+                proc.wait()
+            print("%-14s %8d %10.0f %10.2f %10.2f" % (
+                name, clients, result["rps"], result["p50_ms"], result["p99_ms"]))
+            time.sleep(0.2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
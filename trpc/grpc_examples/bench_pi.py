@@ -0,0 +1,41 @@
+import time
+import random
+
+import pi_cache
+from pi_cache import PiSeries
+
+
+def calc_old(n):
+    s = 0.0
+    for i in range(n):
+        s += 1.0 / (2*i+1) / (2*i+1)
+    return s
+
+
+def run(calc, ns):
+    start = time.perf_counter()
+    for n in ns:
+        calc(n)
+    return time.perf_counter() - start
+
+
+def main():
+    random.seed(1)
+    workloads = [
+        ("client.py, n=0..999", list(range(1000))),
+        ("random n<100k x200", [random.randrange(100000) for _ in range(200)]),
+        ("n=2M x3", [2000000] * 3),
+    ]
+    print("%-22s %10s %10s %14s" % ("workload", "old s", "cached s", "cached no-np s"))
+    numpy = pi_cache.numpy
+    for label, ns in workloads:
+        old = run(calc_old, ns)
+        cached = run(PiSeries(), ns)
+        pi_cache.numpy = None
+        pure = run(PiSeries(), ns)
+        pi_cache.numpy = numpy
+        print("%-22s %10.4f %10.4f %14.4f" % (label, old, cached, pure))
+
+
+if __name__ == '__main__':
+    main()
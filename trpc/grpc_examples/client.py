@@ -1,16 +1,55 @@
+import sys
+import time
+import argparse
+
 import grpc
 
 import pi_pb2
 import pi_pb2_grpc
 
 
-def main():
-    channel = grpc.insecure_channel('127.0.0.1:8080')
+def calc_unary(client, ns):
+    return [client.Calc(pi_pb2.PiRequest(n=n)).value for n in ns]
+
+
+def calc_batch(client, ns, batch_size):
+    values = []
+    for i in range(0, len(ns), batch_size):
+        values.extend(client.CalcBatch(pi_pb2.PiBatchRequest(n=ns[i:i + batch_size])).value)
+    return values
+
+
+def calc_stream(client, ns):
+    return [response.value for response in client.CalcStream(pi_pb2.PiRequest(n=n) for n in ns)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="127.0.0.1:8080")
+    parser.add_argument("--mode", choices=["unary", "batch", "stream"], default="unary")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    channel = grpc.insecure_channel(args.target)
     client = pi_pb2_grpc.PiCalculatorStub(channel)
+    ns = list(range(args.count))
+
+    start = time.perf_counter()
+    if args.mode == "unary":
+        values = calc_unary(client, ns)
+    elif args.mode == "batch":
+        values = calc_batch(client, ns, args.batch_size)
+    else:
+        values = calc_stream(client, ns)
+    elapsed = time.perf_counter() - start
 
-    for i in range(1000):
-        print("pi(%d) =" % i, client.Calc(pi_pb2.PiRequest(n=i)).value)
+    if not args.quiet:
+        for n, value in zip(ns, values):
+            print("pi(%d) =" % n, value)
+    print("%s: %d values in %.3fs" % (args.mode, len(values), elapsed), file=sys.stderr)
 
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,86 @@
+import threading
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, large tails fall back to the pure Python loop
+    numpy = None
+
+
+def partial_sum(start, stop, s=0.0, step=None):
+    reached = []  # (k, S(k)) for every multiple of step passed on the way
+    if step:
+        for k in range((start // step + 1) * step, stop + 1, step):
+            for i in range(start, k):
+                s += 1.0 / (2*i+1) / (2*i+1)
+            reached.append((k, s))
+            start = k
+    for i in range(start, stop):
+        s += 1.0 / (2*i+1) / (2*i+1)
+    return s, reached
+
+
+def partial_sum_numpy(start, stop, s=0.0, step=None, block=1 << 18):
+    # cumsum adds in the same order as the loop above, so results are identical
+    reached = []
+    while start < stop:
+        end = min(stop, start + block)
+        i = numpy.arange(start, end, dtype=numpy.float64)
+        terms = 1.0 / (2*i+1) / (2*i+1)
+        terms[0] += s
+        sums = numpy.cumsum(terms)
+        if step:
+            for k in range((start // step + 1) * step, end + 1, step):
+                reached.append((k, float(sums[k - start - 1])))
+        s = float(sums[-1])
+        start = end
+    return s, reached
+
+
+class PiSeries(object):
+    """Shared cache of S(n) = sum(1 / (2i+1)^2 for i < n).
+
+    Checkpoints S(k * step) are kept so any request only sums the tail
+    after the nearest checkpoint, and the highest n computed so far is
+    remembered so ascending requests only compute the new terms. When
+    the checkpoint list is full the step doubles and every other
+    checkpoint is dropped, which bounds memory for any n.
+    """
+
+    def __init__(self, step=4096, max_checkpoints=4096, numpy_threshold=10000):
+        self.step = step
+        self.max_checkpoints = max_checkpoints
+        self.numpy_threshold = numpy_threshold
+        self.checkpoints = [0.0]  # checkpoints[k] == S(k * step)
+        self.frontier = (0, 0.0)  # highest (n, S(n)) computed so far
+        self.lock = threading.Lock()
+
+    def start_for(self, n):
+        with self.lock:
+            k = max(min(n // self.step, len(self.checkpoints) - 1), 0)
+            start = (k * self.step, self.checkpoints[k], self.step)
+            if start[0] <= self.frontier[0] <= n:
+                start = self.frontier + (self.step,)
+            return start
+
+    def __call__(self, n):
+        if n <= 0:
+            return 0.0
+        start, s, step = self.start_for(n)
+        if numpy is not None and n - start >= self.numpy_threshold:
+            s, reached = partial_sum_numpy(start, n, s, step)
+        else:
+            s, reached = partial_sum(start, n, s, step)
+        self.update(reached, step, n, s)
+        return s
+
+    def update(self, reached, step, n, s):
+        with self.lock:
+            if step == self.step:
+                for k, value in reached:
+                    if k == len(self.checkpoints) * self.step:
+                        self.checkpoints.append(value)
+            if len(self.checkpoints) > self.max_checkpoints:
+                self.checkpoints = self.checkpoints[::2]
+                self.step *= 2
+            if n > self.frontier[0]:
+                self.frontier = (n, s)
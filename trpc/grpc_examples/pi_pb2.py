@@ -1,13 +1,22 @@
+# -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: pi.proto
-
-import sys
-_b=sys.version_info[0]<3 and (lambda x:x) or (lambda x:x.encode('latin1'))
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
-from google.protobuf import message as _message
-from google.protobuf import reflection as _reflection
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
-from google.protobuf import descriptor_pb2
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'pi.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
@@ -15,118 +24,21 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor.FileDescriptor(
-  name='pi.proto',
-  package='pi',
-  syntax='proto3',
-  serialized_pb=_b('\n\x08pi.proto\x12\x02pi\"\x16\n\tPiRequest\x12\t\n\x01n\x18\x01 \x01(\x05\"\x1b\n\nPiResponse\x12\r\n\x05value\x18\x01 \x01(\x01\x32\x37\n\x0cPiCalculator\x12\'\n\x04\x43\x61lc\x12\r.pi.PiRequest\x1a\x0e.pi.PiResponse\"\x00\x62\x06proto3')
-)
-
-
-
-
-_PIREQUEST = _descriptor.Descriptor(
-  name='PiRequest',
-  full_name='pi.PiRequest',
-  filename=None,
-  file=DESCRIPTOR,
-  containing_type=None,
-  fields=[
-    _descriptor.FieldDescriptor(
-      name='n', full_name='pi.PiRequest.n', index=0,
-      number=1, type=5, cpp_type=1, label=1,
-      has_default_value=False, default_value=0,
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      options=None, file=DESCRIPTOR),
-  ],
-  extensions=[
-  ],
-  nested_types=[],
-  enum_types=[
-  ],
-  options=None,
-  is_extendable=False,
-  syntax='proto3',
-  extension_ranges=[],
-  oneofs=[
-  ],
-  serialized_start=16,
-  serialized_end=38,
-)
-
-
-_PIRESPONSE = _descriptor.Descriptor(
-  name='PiResponse',
-  full_name='pi.PiResponse',
-  filename=None,
-  file=DESCRIPTOR,
-  containing_type=None,
-  fields=[
-    _descriptor.FieldDescriptor(
-      name='value', full_name='pi.PiResponse.value', index=0,
-      number=1, type=1, cpp_type=5, label=1,
-      has_default_value=False, default_value=float(0),
-      message_type=None, enum_type=None, containing_type=None,
-      is_extension=False, extension_scope=None,
-      options=None, file=DESCRIPTOR),
-  ],
-  extensions=[
-  ],
-  nested_types=[],
-  enum_types=[
-  ],
-  options=None,
-  is_extendable=False,
-  syntax='proto3',
-  extension_ranges=[],
-  oneofs=[
-  ],
-  serialized_start=40,
-  serialized_end=67,
-)
-
-DESCRIPTOR.message_types_by_name['PiRequest'] = _PIREQUEST
-DESCRIPTOR.message_types_by_name['PiResponse'] = _PIRESPONSE
-_sym_db.RegisterFileDescriptor(DESCRIPTOR)
-
-PiRequest = _reflection.GeneratedProtocolMessageType('PiRequest', (_message.Message,), dict(
-  DESCRIPTOR = _PIREQUEST,
-  __module__ = 'pi_pb2'
-  # @@protoc_insertion_point(class_scope:pi.PiRequest)
-  ))
-_sym_db.RegisterMessage(PiRequest)
-
-PiResponse = _reflection.GeneratedProtocolMessageType('PiResponse', (_message.Message,), dict(
-  DESCRIPTOR = _PIRESPONSE,
-  __module__ = 'pi_pb2'
-  # @@protoc_insertion_point(class_scope:pi.PiResponse)
-  ))
-_sym_db.RegisterMessage(PiResponse)
-
-
-
-_PICALCULATOR = _descriptor.ServiceDescriptor(
-  name='PiCalculator',
-  full_name='pi.PiCalculator',
-  file=DESCRIPTOR,
-  index=0,
-  options=None,
-  serialized_start=69,
-  serialized_end=124,
-  methods=[
-  _descriptor.MethodDescriptor(
-    name='Calc',
-    full_name='pi.PiCalculator.Calc',
-    index=0,
-    containing_service=None,
-    input_type=_PIREQUEST,
-    output_type=_PIRESPONSE,
-    options=None,
-  ),
-])
-_sym_db.RegisterServiceDescriptor(_PICALCULATOR)
-
-DESCRIPTOR.services_by_name['PiCalculator'] = _PICALCULATOR
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x08pi.proto\x12\x02pi\"\x16\n\tPiRequest\x12\t\n\x01n\x18\x01 \x01(\x05\"\x1b\n\nPiResponse\x12\r\n\x05value\x18\x01 \x01(\x01\"\x1b\n\x0ePiBatchRequest\x12\t\n\x01n\x18\x01 \x03(\x05\" \n\x0fPiBatchResponse\x12\r\n\x05value\x18\x01 \x03(\x01\x32\xa2\x01\n\x0cPiCalculator\x12\'\n\x04\x43\x61lc\x12\r.pi.PiRequest\x1a\x0e.pi.PiResponse\"\x00\x12\x36\n\tCalcBatch\x12\x12.pi.PiBatchRequest\x1a\x13.pi.PiBatchResponse\"\x00\x12\x31\n\nCalcStream\x12\r.pi.PiRequest\x1a\x0e.pi.PiResponse\"\x00(\x01\x30\x01\x62\x06proto3')
 
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'pi_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_PIREQUEST']._serialized_start=16
+  _globals['_PIREQUEST']._serialized_end=38
+  _globals['_PIRESPONSE']._serialized_start=40
+  _globals['_PIRESPONSE']._serialized_end=67
+  _globals['_PIBATCHREQUEST']._serialized_start=69
+  _globals['_PIBATCHREQUEST']._serialized_end=96
+  _globals['_PIBATCHRESPONSE']._serialized_start=98
+  _globals['_PIBATCHRESPONSE']._serialized_end=130
+  _globals['_PICALCULATOR']._serialized_start=133
+  _globals['_PICALCULATOR']._serialized_end=295
 # @@protoc_insertion_point(module_scope)
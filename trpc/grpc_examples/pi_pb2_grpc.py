@@ -1,46 +1,183 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
 import pi_pb2 as pi__pb2
 
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
 
-class PiCalculatorStub(object):
-  # missing associated documentation comment in .proto file
-  pass
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
 
-  def __init__(self, channel):
-    """Constructor.
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in pi_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
 
-    Args:
-      channel: A grpc.Channel.
-    """
-    self.Calc = channel.unary_unary(
-        '/pi.PiCalculator/Calc',
-        request_serializer=pi__pb2.PiRequest.SerializeToString,
-        response_deserializer=pi__pb2.PiResponse.FromString,
-        )
 
+class PiCalculatorStub:
+    """Missing associated documentation comment in .proto file."""
 
-class PiCalculatorServicer(object):
-  # missing associated documentation comment in .proto file
-  pass
+    def __init__(self, channel):
+        """Constructor.
 
-  def Calc(self, request, context):
-    # missing associated documentation comment in .proto file
-    pass
-    context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-    context.set_details('Method not implemented!')
-    raise NotImplementedError('Method not implemented!')
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Calc = channel.unary_unary(
+                '/pi.PiCalculator/Calc',
+                request_serializer=pi__pb2.PiRequest.SerializeToString,
+                response_deserializer=pi__pb2.PiResponse.FromString,
+                _registered_method=True)
+        self.CalcBatch = channel.unary_unary(
+                '/pi.PiCalculator/CalcBatch',
+                request_serializer=pi__pb2.PiBatchRequest.SerializeToString,
+                response_deserializer=pi__pb2.PiBatchResponse.FromString,
+                _registered_method=True)
+        self.CalcStream = channel.stream_stream(
+                '/pi.PiCalculator/CalcStream',
+                request_serializer=pi__pb2.PiRequest.SerializeToString,
+                response_deserializer=pi__pb2.PiResponse.FromString,
+                _registered_method=True)
+
+
+class PiCalculatorServicer:
+    """Missing associated documentation comment in .proto file."""
+
+    def Calc(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CalcBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CalcStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
 
 
 def add_PiCalculatorServicer_to_server(servicer, server):
-  rpc_method_handlers = {
-      'Calc': grpc.unary_unary_rpc_method_handler(
-          servicer.Calc,
-          request_deserializer=pi__pb2.PiRequest.FromString,
-          response_serializer=pi__pb2.PiResponse.SerializeToString,
-      ),
-  }
-  generic_handler = grpc.method_handlers_generic_handler(
-      'pi.PiCalculator', rpc_method_handlers)
-  server.add_generic_rpc_handlers((generic_handler,))
+    rpc_method_handlers = {
+            'Calc': grpc.unary_unary_rpc_method_handler(
+                    servicer.Calc,
+                    request_deserializer=pi__pb2.PiRequest.FromString,
+                    response_serializer=pi__pb2.PiResponse.SerializeToString,
+            ),
+            'CalcBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.CalcBatch,
+                    request_deserializer=pi__pb2.PiBatchRequest.FromString,
+                    response_serializer=pi__pb2.PiBatchResponse.SerializeToString,
+            ),
+            'CalcStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.CalcStream,
+                    request_deserializer=pi__pb2.PiRequest.FromString,
+                    response_serializer=pi__pb2.PiResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'pi.PiCalculator', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('pi.PiCalculator', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class PiCalculator:
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def Calc(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/pi.PiCalculator/Calc',
+            pi__pb2.PiRequest.SerializeToString,
+            pi__pb2.PiResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CalcBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/pi.PiCalculator/CalcBatch',
+            pi__pb2.PiBatchRequest.SerializeToString,
+            pi__pb2.PiBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CalcStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/pi.PiCalculator/CalcStream',
+            pi__pb2.PiRequest.SerializeToString,
+            pi__pb2.PiResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,33 +1,52 @@
+import sys
 import math
+import argparse
 import grpc
-import time
 from concurrent import futures
 
 import pi_pb2
 import pi_pb2_grpc
+from pi_cache import PiSeries
 
 
 class PiCalculatorServicer(pi_pb2_grpc.PiCalculatorServicer):
 
+    def __init__(self):
+        self.series = PiSeries()  # shared by all worker threads
+
+    def pi(self, n):
+        return math.sqrt(8*self.series(n))
+
     def Calc(self, request, ctx):
-        s = 0.0
-        for i in range(request.n):
-            s += 1.0 / (2*i+1) / (2*i+1)
-        return pi_pb2.PiResponse(value=math.sqrt(8*s))
+        return pi_pb2.PiResponse(value=self.pi(request.n))
+
+    def CalcBatch(self, request, ctx):
+        return pi_pb2.PiBatchResponse(value=[self.pi(n) for n in request.n])
+
+    def CalcStream(self, request_iterator, ctx):
+        for request in request_iterator:
+            yield pi_pb2.PiResponse(value=self.pi(request.n))
+
 
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", default="127.0.0.1:8080")
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--max-concurrent-rpcs", type=int, default=None)
+    args = parser.parse_args(argv)
 
-def main():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=args.workers),
+                         maximum_concurrent_rpcs=args.max_concurrent_rpcs)
     servicer = PiCalculatorServicer()
     pi_pb2_grpc.add_PiCalculatorServicer_to_server(servicer, server)
-    server.add_insecure_port('127.0.0.1:8080')
+    server.add_insecure_port(args.address)
     server.start()
 
     try:
-        time.sleep(1000)
+        server.wait_for_termination()
     except KeyboardInterrupt:
         server.stop(0)
 
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
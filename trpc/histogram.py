@@ -0,0 +1,69 @@
+# coding: utf8
+# Python 2.x / 3.x
+# HDR 风格的对数-线性直方图：每翻一倍的区间再均分成 2^(sub_bits-1) 个桶，
+# 相对误差不超过 1/2^(sub_bits-1)，桶数固定，可以直接相加合并（多进程、共享内存）
+
+import math
+
+
+class Histogram(object):
+
+    def __init__(self, sub_bits=7, max_bits=40, counts=None):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.size = (max_bits - sub_bits + 2) * self.half
+        self.max_value = (1 << max_bits) - 1
+        self.counts = counts if counts is not None else [0] * self.size
+
+    def index(self, value):
+        if value < 2 * self.half:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return (shift + 1) * self.half + (value >> shift) - self.half
+
+    def bounds(self, index):
+        # 桶内取值范围 [low, high]
+        if index < 2 * self.half:
+            return index, index
+        shift = index // self.half - 1
+        sub = index - shift * self.half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self.index(value)] += count
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        return self
+
+    @property
+    def total(self):
+        return sum(self.counts)
+
+    def percentile(self, q):
+        total = self.total
+        if not total:
+            return 0
+        rank = max(1, int(math.ceil(total * q / 100.0)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds(i)[1]
+        return self.max_value
+
+    def mean(self):
+        total = self.total
+        if not total:
+            return 0.0
+        return sum(sum(self.bounds(i)) / 2.0 * count for i, count in enumerate(self.counts) if count) / total
+
+    def to_dict(self):
+        # 只导出非零桶，便于存 JSON
+        return {
+            "sub_bits": self.sub_bits,
+            "buckets": [[self.bounds(i)[1], count] for i, count in enumerate(self.counts) if count],
+        }
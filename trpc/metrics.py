@@ -0,0 +1,171 @@
+# coding: utf8
+# Python 3.x
+# 按方法统计调用次数、错误次数、处理中的请求数和延迟直方图
+# 计数放在 fork 之前创建的匿名共享内存里，每个 worker 只写自己的区域，不需要加锁；
+# 任何一个 worker 都能读出所有区域并汇总，通过保留方法 __stats__ 或 Prometheus 文本格式导出
+#
+# 每个区域 methods 个槽位，每个槽位：方法名 48 字节 + calls/errors/inflight 三个 int64 + 直方图桶
+
+import mmap
+import time
+import asyncio
+
+from histogram import Histogram
+
+NAME_SIZE = 48
+COUNTERS = 3  # calls, errors, inflight
+HIST_SUB_BITS, HIST_MAX_BITS = 5, 32  # 相对误差约 6%，上限约 71 分钟（微秒）
+HIST_SIZE = Histogram(HIST_SUB_BITS, HIST_MAX_BITS).size
+SLOT_SIZE = NAME_SIZE + (COUNTERS + HIST_SIZE) * 8
+OTHER = "__other__"  # 槽位用完之后的方法都记在这里
+# Prometheus 直方图固定输出的 le（秒）
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MethodStats(object):
+
+    def __init__(self, view):
+        self.counters = view[NAME_SIZE:NAME_SIZE + COUNTERS * 8].cast("q")
+        self.hist = Histogram(HIST_SUB_BITS, HIST_MAX_BITS, counts=view[NAME_SIZE + COUNTERS * 8:].cast("q"))
+
+
+class Metrics(object):
+
+    def __init__(self, regions=1, methods=32):
+        self.regions = regions
+        self.methods = methods
+        self.region_size = methods * SLOT_SIZE
+        self.buf = mmap.mmap(-1, regions * self.region_size)  # MAP_SHARED|MAP_ANONYMOUS，fork 后父子进程共享
+        self.view = memoryview(self.buf)
+        self.region = 0
+        self.cache = {}
+
+    def bind(self, region):
+        # worker 进程 fork 之后调用，之后只写这个区域；上一个占用者可能崩溃在请求中途，清掉 inflight
+        self.region = region
+        self.cache = {}
+        for i in range(self.methods):
+            offset = self.slot_offset(region, i)
+            if self.view[offset] != 0:
+                MethodStats(self.view[offset:offset + SLOT_SIZE]).counters[2] = 0
+
+    def slot_offset(self, region, index):
+        return region * self.region_size + index * SLOT_SIZE
+
+    def slot_name(self, offset):
+        return bytes(self.view[offset:offset + NAME_SIZE]).rstrip(b"\0").decode(errors="ignore")
+
+    def stats(self, method):
+        stats = self.cache.get(method)
+        if stats is None:
+            name = method.encode()[:NAME_SIZE].decode(errors="ignore")
+            stats = self.cache[method] = MethodStats(self.claim(name))
+        return stats
+
+    def claim(self, name):
+        # 在本区域找同名槽位或第一个空槽位，最后一个槽位留给 __other__
+        for i in range(self.methods):
+            offset = self.slot_offset(self.region, i)
+            current = self.slot_name(offset)
+            if current == name:
+                return self.view[offset:offset + SLOT_SIZE]
+            if not current:
+                if i == self.methods - 1 and name != OTHER:
+                    break
+                encoded = name.encode()
+                self.view[offset:offset + len(encoded)] = encoded
+                return self.view[offset:offset + SLOT_SIZE]
+        return self.claim(OTHER)
+
+    def begin(self, method):
+        stats = self.stats(method)
+        stats.counters[2] += 1
+        return stats, time.perf_counter()
+
+    def end(self, token, error=False):
+        stats, start = token
+        counters = stats.counters
+        counters[0] += 1
+        if error:
+            counters[1] += 1
+        counters[2] -= 1
+        stats.hist.record((time.perf_counter() - start) * 1e6)
+
+    def collect(self):
+        # 汇总所有区域：方法名 -> (calls, errors, inflight, Histogram)
+        merged = {}
+        for region in range(self.regions):
+            for i in range(self.methods):
+                offset = self.slot_offset(region, i)
+                name = self.slot_name(offset)
+                if not name:
+                    break
+                stats = MethodStats(self.view[offset:offset + SLOT_SIZE])
+                if name not in merged:
+                    merged[name] = [0, 0, 0, Histogram(HIST_SUB_BITS, HIST_MAX_BITS)]
+                total = merged[name]
+                for k in range(COUNTERS):
+                    total[k] += stats.counters[k]
+                total[3].merge(stats.hist)
+        return merged
+
+    def snapshot(self):
+        snapshot = {}
+        for name, (calls, errors, inflight, hist) in sorted(self.collect().items()):
+            snapshot[name] = {
+                "calls": calls,
+                "errors": errors,
+                "inflight": inflight,
+                "latency_us": {
+                    "p50": hist.percentile(50),
+                    "p99": hist.percentile(99),
+                    "p999": hist.percentile(99.9),
+                },
+            }
+        return snapshot
+
+    def prometheus(self):
+        # 每个指标族的样本放在自己的 # TYPE 下面；
+        # 直方图总是输出同一组 le，空桶也输出，rate()/histogram_quantile 才能跨抓取、跨 worker 计算
+        collected = sorted(self.collect().items())
+        labels = ['method="%s"' % name.replace("\\", "\\\\").replace('"', '\\"') for name, _ in collected]
+        lines = []
+        for metric, kind, k in (("trpc_calls_total", "counter", 0), ("trpc_errors_total", "counter", 1),
+                                ("trpc_inflight", "gauge", 2)):
+            lines.append("# TYPE %s %s" % (metric, kind))
+            for label, (name, values) in zip(labels, collected):
+                lines.append("%s{%s} %d" % (metric, label, values[k]))
+        lines.append("# TYPE trpc_latency_seconds histogram")
+        for label, (name, (calls, errors, inflight, hist)) in zip(labels, collected):
+            seen, i = 0, 0
+            for le in LATENCY_BUCKETS:
+                # 上界不超过 le 的桶都算进去，跨 le 的桶算到下一个 le
+                while i < hist.size and hist.bounds(i)[1] <= le * 1e6:
+                    seen += hist.counts[i]
+                    i += 1
+                lines.append('trpc_latency_seconds_bucket{%s,le="%g"} %d' % (label, le, seen))
+            total = hist.total
+            lines.append('trpc_latency_seconds_bucket{%s,le="+Inf"} %d' % (label, total))
+            lines.append("trpc_latency_seconds_count{%s} %d" % (label, total))
+            lines.append("trpc_latency_seconds_sum{%s} %g" % (label, hist.mean() * total / 1e6))
+        return "\n".join(lines) + "\n"
+
+
+async def serve_prometheus(metrics, host, port, sock=None):
+    # 极简 HTTP/1.0，只回一个文本页面，给 Prometheus 抓取用
+    async def on_connect(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = metrics.prometheus().encode()
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if sock is not None:
+        return await asyncio.start_server(on_connect, sock=sock)
+    return await asyncio.start_server(on_connect, host, port)
@@ -0,0 +1,83 @@
+# coding: utf8
+# Python 3.x
+# 单连接多路复用客户端：每个请求带一个自增 id，后台任务持续读响应，按 id 交给对应的 future
+# 服务端不回 id 时（老服务器），按发送顺序匹配
+
+import asyncio
+import itertools
+import collections
+
+from framing import HEADER, CODEC_SHIFT, LENGTH_MASK, pack_header
+from serialization import CODECS, JSON, get_codec
+
+
+class MuxClient(object):
+
+    def __init__(self, reader, writer, codec=JSON):
+        self.reader = reader
+        self.writer = writer
+        self.codec = get_codec(codec)
+        self.ids = itertools.count(1)
+        self.pending = collections.OrderedDict()  # id -> future，保持发送顺序
+        self.ordered = False  # 服务端不回 id，只能按顺序匹配
+        self.read_task = asyncio.ensure_future(self.read_loop())
+
+    @classmethod
+    async def connect(cls, host, port, codec=JSON, **kwargs):
+        reader, writer = await asyncio.open_connection(host, port, **kwargs)
+        return cls(reader, writer, codec)
+
+    async def read_loop(self):
+        try:
+            while True:
+                length_prefix = await self.reader.readexactly(HEADER.size)
+                word, = HEADER.unpack(length_prefix)
+                body = await self.reader.readexactly(word & LENGTH_MASK)
+                response = CODECS[word >> CODEC_SHIFT].decode(body)
+                id_ = response.get('id')
+                if id_ is None:  # 服务端不支持 id，取最早发出的请求
+                    self.ordered = True
+                    future = self.pending.popitem(last=False)[1] if self.pending else None
+                else:
+                    future = self.pending.pop(id_, None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            exc = e if isinstance(e, ConnectionError) else ConnectionError(str(e) or 'connection closed')
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(exc)
+            self.pending.clear()
+
+    @property
+    def closed(self):
+        return self.read_task.done()
+
+    async def call(self, in_, params):
+        if self.closed:
+            raise ConnectionError('connection closed')
+        id_ = next(self.ids)
+        future = asyncio.get_event_loop().create_future()
+        self.pending[id_] = future
+        buffers = self.codec.encode({'in': in_, 'params': params, 'id': id_})
+        self.writer.writelines([pack_header(sum(len(buf) for buf in buffers), self.codec.id)] + buffers)
+        try:
+            await self.writer.drain()
+            return await future
+        finally:
+            if self.pending.pop(id_, None) is not None and self.ordered:
+                # 超时或取消：按顺序匹配时后面的响应都会错位，只能断开连接
+                self.writer.close()
+
+    async def close(self):
+        self.read_task.cancel()
+        # 等响应的调用方看到的是连接错误而不是 CancelledError，和连接断开时一样处理
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('connection closed'))
+        self.pending.clear()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
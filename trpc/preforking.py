@@ -6,6 +6,9 @@ import json
 import struct
 import socket
 
+from framing import sendmsg_all
+from sampling import log_sampled
+
 
 def handle_conn(conn, addr, handlers):
     print(addr, "comes")
@@ -20,7 +23,7 @@ def handle_conn(conn, addr, handlers):
         request = json.loads(body.decode())
         in_ = request['in']
         params = request['params']
-        print(in_, params)
+        log_sampled(in_, params)
         handler = handlers[in_]
         handler(conn, params)
 
@@ -37,9 +40,9 @@ def ping(conn, params):
 
 def send_result(conn, out, result):
     response = json.dumps({"out": out, "result": result})
-    length_prefix = struct.pack("I", len(response))
-    conn.send(length_prefix)
-    conn.sendall(response.encode())
+    body = response.encode()
+    length_prefix = struct.pack("I", len(body))
+    sendmsg_all(conn, [length_prefix, body])  # 头和消息体一次 sendmsg 写出
 
 
 def prefork(n):
@@ -0,0 +1,237 @@
+# coding: utf8
+# Python 3.x, Linux
+# master/worker 模式：每个 worker 各自 bind 一个 SO_REUSEPORT 套接字，由内核在 worker 之间分发连接，
+# 不再共享同一个 accept 队列。master 只负责监督：
+#   worker 崩溃自动拉起；SIGTERM/SIGINT 优雅退出（worker 停止accept，处理完已收到的请求再退出）；
+#   SIGHUP 滚动重启（先起新 worker，就绪后再让旧 worker 退出，监听端口始终有人接管）
+# 限制：旧 worker 退出时关闭自己的 SO_REUSEPORT 套接字，内核已经分给它、还在 accept 队列里的连接会被 RST。
+#   Linux 5.14+ 打开 net.ipv4.tcp_migrate_req 后，内核会把这些连接转给同组的其他监听套接字；
+#   没打开时启动会打印提示，滚动重启期间少量连接可能失败，客户端需要重试
+# 统计数据放在 fork 之前创建的共享内存里（metrics.py），每个槽位两块区域，滚动重启时新旧 worker 各写一块
+
+import os
+import sys
+import time
+import select
+import signal
+import socket
+import asyncio
+import argparse
+import traceback
+import multiprocessing
+
+from asyncio_server import RPCHandler, RPCServer, DEFAULT_CODECS, loop_policy
+from executors import Executors
+from metrics import Metrics, serve_prometheus
+from serialization import PICKLE
+
+SIGNALS = {signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP}
+MIGRATE_REQ = "/proc/sys/net/ipv4/tcp_migrate_req"
+
+
+def migrate_req_enabled():
+    # 内核太老没有这个开关时返回 None
+    try:
+        with open(MIGRATE_REQ) as f:
+            return f.read().strip() == "1"
+    except OSError:
+        return None
+
+
+def reuseport_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class Master(object):
+
+    def __init__(self, host, port, workers=os.cpu_count(), backlog=1024,
+                 loop="auto", drain_timeout=10.0, ready_timeout=10.0, codecs=DEFAULT_CODECS,
+                 metrics_port=None, threads=32, processes=1, queue_size=None, handler_class=RPCHandler):
+        self.host = host
+        self.port = port
+        self.nworkers = workers
+        self.backlog = backlog
+        self.loop = loop
+        self.drain_timeout = drain_timeout
+        self.ready_timeout = ready_timeout
+        self.codecs = codecs
+        self.metrics_port = metrics_port
+        self.handler_class = handler_class
+        # 每个 worker 自己的执行池：进程池按 worker 计，总进程数是 workers × processes，默认每个 worker 1 个
+        self.threads = threads
+        self.processes = processes
+        self.queue_size = queue_size
+        self.metrics = Metrics(regions=2 * workers)
+        self.regions = {}  # slot -> 当前使用的统计区域
+        self.workers = {}  # pid -> (slot, 启动时间)
+        self.retiring = set()  # 已经发了 SIGTERM、正在退出的旧 worker
+        self.respawn_at = {}  # slot -> 允许重启的时间，防止启动即崩溃时疯狂 fork
+
+    async def serve(self, ready_fd, region):
+        loop = asyncio.get_event_loop()
+        stopping = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+        loop.add_signal_handler(signal.SIGINT, stopping.set)
+
+        self.metrics.bind(region)
+        # worker 是 fork 出来的，进程池用 forkserver 启动，不再从 worker 里直接 fork
+        executors = Executors(self.threads, self.processes, self.queue_size,
+                              mp_context=multiprocessing.get_context("forkserver"))
+        server = RPCServer(self.host, self.port, handler_class=self.handler_class, backlog=self.backlog,
+                           codecs=self.codecs, executors=executors, metrics=self.metrics)
+        await server.start(sock=reuseport_socket(self.host, self.port, self.backlog))
+        if self.metrics_port:  # 每个 worker 都能汇总全部统计，谁接到抓取请求都一样
+            await serve_prometheus(self.metrics, None, None,
+                                   sock=reuseport_socket(self.host, self.metrics_port, self.backlog))
+        os.write(ready_fd, b"1")  # 通知 master 已经开始监听
+        os.close(ready_fd)
+
+        await stopping.wait()
+        await server.drain(self.drain_timeout)
+
+    def spawn(self, slot, region):
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child process
+            os.close(rfd)
+            code = 0
+            try:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+                asyncio.set_event_loop_policy(loop_policy(self.loop))
+                asyncio.run(self.serve(wfd, region))
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(wfd)
+        self.regions[slot] = region
+        self.workers[pid] = (slot, time.monotonic())
+        return pid, rfd
+
+    def wait_ready(self, rfd):
+        # 等待新 worker 写入就绪标记；超时或 worker 提前退出都算失败
+        try:
+            readable, _, _ = select.select([rfd], [], [], self.ready_timeout)
+            return bool(readable) and os.read(rfd, 1) == b"1"
+        finally:
+            os.close(rfd)
+
+    def start_slot(self, slot, region=None):
+        # 崩溃重启沿用原来的区域；滚动重启换到另一块，旧 worker 还在写原来那块
+        pid, rfd = self.spawn(slot, self.regions.get(slot, slot) if region is None else region)
+        ready = self.wait_ready(rfd)
+        print(os.getpid(), 'worker', slot, pid, 'ready' if ready else 'failed')
+        return pid, ready
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            slot, started = self.workers.pop(pid, (None, 0))
+            if slot is None:
+                continue
+            print(os.getpid(), 'worker', slot, pid, 'died with status', status)
+            # 启动不到1秒就挂掉的，延迟1秒再拉起
+            delay = 1.0 if time.monotonic() - started < 1.0 else 0.0
+            self.respawn_at[slot] = time.monotonic() + delay
+
+    def respawn(self):
+        now = time.monotonic()
+        for slot, due in list(self.respawn_at.items()):
+            if due <= now:
+                del self.respawn_at[slot]
+                self.start_slot(slot)
+
+    def rolling_restart(self):
+        for pid, (slot, _) in sorted(self.workers.items(), key=lambda item: item[1][0]):
+            old_region = self.regions[slot]
+            new_pid, ready = self.start_slot(slot, slot + self.nworkers if old_region == slot else slot)
+            if not ready:
+                self.regions[slot] = old_region  # 新 worker 起不来，保留旧的，放弃这次滚动重启
+                self.retire(new_pid)
+                return
+            self.retire(pid)
+
+    def retire(self, pid):
+        self.workers.pop(pid, None)
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.retiring.discard(pid)
+
+    def shutdown(self):
+        for pid in list(self.workers):
+            self.retire(pid)
+        deadline = time.monotonic() + self.drain_timeout + 5
+        while self.retiring and time.monotonic() < deadline:
+            signal.sigtimedwait([signal.SIGCHLD], 0.5)
+            self.reap()
+        for pid in list(self.retiring):  # 超时仍未退出的强制结束
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self):
+        # 信号全部屏蔽后用 sigtimedwait 同步处理，避免信号处理函数里 fork/waitpid 的竞争
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        if not migrate_req_enabled():
+            print(os.getpid(), 'warning: %s is off, connections queued in a retiring worker get reset '
+                  'during rolling restarts (sysctl -w net.ipv4.tcp_migrate_req=1, Linux 5.14+)' % MIGRATE_REQ)
+        for slot in range(self.nworkers):
+            self.start_slot(slot)
+        while True:
+            info = signal.sigtimedwait(SIGNALS, 1.0)
+            self.reap()
+            if info is not None:
+                if info.si_signo in (signal.SIGTERM, signal.SIGINT):
+                    print(os.getpid(), 'master shutting down')
+                    self.shutdown()
+                    return
+                if info.si_signo == signal.SIGHUP:
+                    print(os.getpid(), 'master rolling restart')
+                    self.rolling_restart()
+                    self.reap()
+            self.respawn()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="192.168.1.195")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--loop", default="auto", choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    parser.add_argument("--allow-pickle", action="store_true")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus text metrics on this port")
+    parser.add_argument("--threads", type=int, default=32, help="thread pool size per worker for blocking handlers")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="process pool size per worker for CPU-bound handlers, 0 for none")
+    parser.add_argument("--queue-size", type=int, help="extra queued calls per pool before callers wait")
+    parser.add_argument("--bench-handlers", action="store_true", help="also serve sleep/blocking_sleep/pi for benchmarks")
+    args = parser.parse_args(argv)
+    codecs = DEFAULT_CODECS | {PICKLE} if args.allow_pickle else DEFAULT_CODECS
+    handler_class = RPCHandler
+    if args.bench_handlers:
+        from bench_handlers import BenchHandler as handler_class
+    Master(args.host, args.port, workers=args.workers, backlog=args.backlog,
+           loop=args.loop, drain_timeout=args.drain_timeout, codecs=codecs,
+           metrics_port=args.metrics_port, threads=args.threads, processes=args.processes,
+           queue_size=args.queue_size, handler_class=handler_class).run()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
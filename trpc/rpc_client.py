@@ -3,35 +3,49 @@ import json
 import struct
 import socket
 import asyncio
+import weakref
 import multiprocessing
 
+from framing import FrameDecoder, sendmsg_all
+from mux_client import MuxClient
+
 G_PROCESS = []
+G_DECODERS = weakref.WeakKeyDictionary()  # 每个socket一个读缓冲
 
 
 async def rpc(sock, in_, params):
-    request = json.dumps({'in': in_, 'params': params})
+    if not isinstance(sock, socket.socket):  # AsyncPool / MuxClient，不会阻塞事件循环
+        return await sock.call(in_, params)
+    request = json.dumps({'in': in_, 'params': params}).encode()
     len_prefix = struct.pack('I', len(request))
-    sock.send(len_prefix)
-    sock.sendall(request.encode())
-    len_prefix = sock.recv(4)
-    print(len_prefix)
-    length, = struct.unpack('I', len_prefix)
-    body = sock.recv(length)
-    response = json.loads(body.decode())
-    return response
+    sendmsg_all(sock, [len_prefix, request])
+    return json.loads(read_frame(sock).decode())
 
 
-def main(t_num):
-    loop = asyncio.get_event_loop()
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.connect(('192.168.1.195', 8080))
+def read_frame(sock):
+    decoder = G_DECODERS.get(sock)
+    if decoder is None:
+        decoder = G_DECODERS[sock] = FrameDecoder()
+    body = decoder.next_frame()
+    while body is None:  # 半包，继续读
+        if not decoder.recv_into(sock):
+            raise ConnectionError('connection closed by server')
+        body = decoder.next_frame()
+    return body
+
+
+async def mux_main(t_num):
+    # 一条连接上同时发出 t_num 个请求，响应按 id 匹配
+    client = await MuxClient.connect('192.168.1.195', 8080)
     pid = os.getpid()
-    tasks = []
-    for item in range(t_num):
-        task = asyncio.ensure_future(rpc(s, 'ping', '{}.{}'.format(pid, item)))
-        tasks.append(task)
+    try:
+        await asyncio.gather(*[client.call('ping', '{}.{}'.format(pid, item)) for item in range(t_num)])
+    finally:
+        await client.close()
+
 
-    loop.run_until_complete(asyncio.wait(tasks))
+def main(t_num):
+    asyncio.run(mux_main(t_num))
 
 
 def prefork(p_num, t_num):
@@ -0,0 +1,212 @@
+# coding: utf8
+# Python 3.x
+# RPC 客户端连接池
+#   SyncPool  线程安全的阻塞连接池，每个连接同一时刻只跑一个请求
+#   AsyncPool asyncio 连接池，每个连接都是 MuxClient，可以同时跑多个请求
+# 两者都支持单次调用超时、幂等方法失败重试、空闲连接健康检查
+
+import time
+import select
+import socket
+import asyncio
+import itertools
+import threading
+import collections
+
+from framing import HEADER, CODEC_SHIFT, LENGTH_MASK, pack_header, sendmsg_all, set_remaining_timeout
+from mux_client import MuxClient
+from serialization import CODECS, JSON, get_codec
+
+IDEMPOTENT = frozenset(["ping"])  # 可以安全重发的方法
+
+
+def recv_exactly(sock, n, deadline=None):
+    # 阻塞版的 readexactly，处理 recv 读不满的情况
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        set_remaining_timeout(sock, deadline)
+        size = sock.recv_into(view[got:], n - got)
+        if not size:
+            raise ConnectionError('connection closed by server')
+        got += size
+    return buf
+
+
+def read_message(sock, deadline=None):
+    word, = HEADER.unpack(recv_exactly(sock, HEADER.size, deadline))
+    return word >> CODEC_SHIFT, recv_exactly(sock, word & LENGTH_MASK, deadline)
+
+
+class Connection(object):
+
+    def __init__(self, host, port, codec=JSON, connect_timeout=3.0):
+        self.sock = socket.create_connection((host, port), connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.codec = get_codec(codec)
+        self.ids = itertools.count(1)
+        self.last_used = time.monotonic()
+
+    def call(self, in_, params, timeout=None):
+        # timeout 限制整次调用，而不是每次 recv：慢慢吐字节的服务器也拖不过截止时间
+        self.sock.settimeout(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        id_ = next(self.ids)
+        buffers = self.codec.encode({'in': in_, 'params': params, 'id': id_})
+        sendmsg_all(self.sock, [pack_header(sum(len(buf) for buf in buffers), self.codec.id)] + buffers, deadline)
+        codec, body = read_message(self.sock, deadline)
+        response = CODECS[codec].decode(body)
+        if response.get('id', id_) != id_:
+            raise ConnectionError('response id mismatch: %r != %r' % (response.get('id'), id_))
+        self.last_used = time.monotonic()
+        return response
+
+    def is_stale(self):
+        # 空闲连接上不该有数据可读，可读说明对端已经关闭（或者协议错位）
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        return bool(readable)
+
+    def close(self):
+        self.sock.close()
+
+
+class SyncPool(object):
+
+    def __init__(self, host, port, size=8, timeout=5.0, connect_timeout=3.0, retries=2,
+                 idempotent=IDEMPOTENT, codec=JSON, health_interval=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.idempotent = idempotent
+        self.codec = codec
+        self.health_interval = health_interval
+        self.idle = collections.deque()  # 后进先出，常用的连接保持热
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def checkout(self):
+        while True:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                return Connection(self.host, self.port, self.codec, self.connect_timeout)
+            if conn.is_stale() or not self.healthy(conn):
+                conn.close()
+                continue
+            return conn
+
+    def healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.health_interval:
+            return True
+        try:
+            conn.call('ping', None, self.connect_timeout)
+            return True
+        except OSError:
+            return False
+
+    def call_once(self, in_, params, timeout):
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError('connection pool exhausted')
+        try:
+            conn = self.checkout()
+            try:
+                response = conn.call(in_, params, timeout)
+            except BaseException:
+                conn.close()  # 出错的连接状态未知，不放回池里
+                raise
+            with self.lock:
+                self.idle.append(conn)
+            return response
+        finally:
+            self.slots.release()
+
+    def call(self, in_, params, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        attempts = self.retries + 1 if in_ in self.idempotent else 1
+        for attempt in range(attempts):
+            try:
+                return self.call_once(in_, params, timeout)
+            except OSError:  # ConnectionError、TimeoutError 都是 OSError
+                if attempt + 1 >= attempts:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+
+    def close(self):
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+
+
+class AsyncPool(object):
+
+    def __init__(self, host, port, size=4, timeout=5.0, connect_timeout=3.0, retries=2,
+                 idempotent=IDEMPOTENT, codec=JSON, health_interval=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.idempotent = idempotent
+        self.codec = codec
+        self.health_interval = health_interval
+        self.clients = [None] * size
+        self.locks = [asyncio.Lock() for _ in range(size)]
+        self.rr = itertools.count()
+        self.health_task = None
+
+    async def __aenter__(self):
+        self.health_task = asyncio.ensure_future(self.run_health_checks())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def client(self):
+        slot = next(self.rr) % len(self.clients)
+        client = self.clients[slot]
+        if client is None or client.closed:
+            async with self.locks[slot]:  # 同一个槽位只建一次连接
+                client = self.clients[slot]
+                if client is None or client.closed:
+                    client = await asyncio.wait_for(
+                        MuxClient.connect(self.host, self.port, self.codec), self.connect_timeout)
+                    self.clients[slot] = client
+        return client
+
+    async def call(self, in_, params, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        attempts = self.retries + 1 if in_ in self.idempotent else 1
+        for attempt in range(attempts):
+            try:
+                client = await self.client()
+                return await asyncio.wait_for(client.call(in_, params), timeout)
+            except (OSError, asyncio.TimeoutError):
+                if attempt + 1 >= attempts:
+                    raise
+                await asyncio.sleep(0.05 * 2 ** attempt)
+
+    async def health_check(self):
+        for slot, client in enumerate(self.clients):
+            if client is None:
+                continue
+            try:
+                await asyncio.wait_for(client.call('ping', None), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError):
+                self.clients[slot] = None
+                await client.close()
+
+    async def run_health_checks(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.health_check()
+
+    async def close(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+        for slot, client in enumerate(self.clients):
+            self.clients[slot] = None
+            if client is not None:
+                await client.close()
@@ -0,0 +1,14 @@
+# coding: utf8
+# Python 2.x / 3.x
+# 请求日志抽样，各个服务器共用：逐个请求 print 本身就是热点开销，每 LOG_EVERY 个请求只打印一次
+from __future__ import print_function
+
+import itertools
+
+LOG_EVERY = 1000
+log_counter = itertools.count()  # 每个进程各自计数
+
+
+def log_sampled(*args):
+    if next(log_counter) % LOG_EVERY == 0:
+        print(*args)
@@ -0,0 +1,120 @@
+# coding: utf8
+# Python 2.x / 3.x (asyncore 在 3.12 被移除)
+# 替代 asyncore.dispatcher_with_send：
+#   dispatcher_with_send 的 out_buffer 是一个不断拼接、每次部分发送后再切片的字符串，
+#   慢客户端会导致内存无上限增长和 O(n^2) 的拷贝。
+#   这里的发送队列由 memoryview 分块组成，部分发送只移动视图，不拷贝数据；
+#   有 sendmsg 时一次系统调用写出多个分块。
+#   队列超过高水位时暂停读这个连接（不再接收新请求），降到低水位后恢复；
+#   超过硬上限说明客户端根本不读响应，直接断开。
+
+import errno
+import socket
+import asyncore
+from collections import deque
+from itertools import islice
+
+IOV_MAX = 1024
+_WOULDBLOCK = frozenset([errno.EWOULDBLOCK, errno.EAGAIN])
+
+
+class dispatcher_with_sendq(asyncore.dispatcher):
+
+    high_watermark = 256 * 1024
+    low_watermark = 64 * 1024
+    max_queued = 16 * 1024 * 1024
+
+    def __init__(self, sock=None, map=None):
+        asyncore.dispatcher.__init__(self, sock, map)
+        self.out_queue = deque()
+        self.queued_bytes = 0
+        self.peak_queued_bytes = 0
+        self.reading_paused = False
+
+    def send(self, data):
+        return self.sendv([data])
+
+    def sendv(self, buffers):
+        # 多个分块一起排队，只触发一次发送
+        size = 0
+        for data in buffers:
+            if len(data):
+                self.out_queue.append(memoryview(data))
+                size += len(data)
+        self.queued_bytes += size
+        self.peak_queued_bytes = max(self.peak_queued_bytes, self.queued_bytes)
+        if self.queued_bytes > self.max_queued:  # 客户端一直不读响应
+            self.out_queue.clear()
+            self.queued_bytes = 0
+            self.handle_close()
+            return 0
+        self.initiate_send()
+        return size
+
+    def initiate_send(self):
+        while self.out_queue:
+            try:
+                if hasattr(self.socket, 'sendmsg'):
+                    sent = self.socket.sendmsg(list(islice(self.out_queue, IOV_MAX)))
+                else:
+                    self.coalesce()
+                    sent = self.socket.send(self.out_queue[0])
+            except socket.error as why:
+                if why.args[0] in _WOULDBLOCK:
+                    return
+                if why.args[0] in asyncore._DISCONNECTED:
+                    self.handle_close()
+                    return
+                raise
+            if not sent:
+                return
+            self.queued_bytes -= sent
+            while sent:
+                head = self.out_queue[0]
+                if sent >= len(head):
+                    sent -= len(head)
+                    self.out_queue.popleft()
+                else:
+                    self.out_queue[0] = head[sent:]  # 只移动视图，不拷贝
+                    sent = 0
+
+    def coalesce(self, limit=65536):
+        # 没有 sendmsg（Python 2）时把开头的小块合并成一次 send，
+        # 否则4字节的长度前缀会单独成包，碰上 Nagle + 延迟确认要多等几十毫秒
+        if len(self.out_queue) < 2 or len(self.out_queue[0]) >= limit:
+            return
+        parts = []
+        size = 0
+        while self.out_queue and size + len(self.out_queue[0]) <= limit:
+            part = self.out_queue.popleft()
+            parts.append(part.tobytes())
+            size += len(part)
+        self.out_queue.appendleft(memoryview(b''.join(parts)))
+
+    def handle_write(self):
+        self.initiate_send()
+
+    def writable(self):
+        return (not self.connected) or bool(self.out_queue)
+
+    def readable(self):
+        if self.reading_paused:
+            self.reading_paused = self.queued_bytes > self.low_watermark
+        else:
+            self.reading_paused = self.queued_bytes >= self.high_watermark
+        return not self.reading_paused
+
+
+def write_queue_stats(map=None):
+    # 每个连接排队待发送的字节数
+    if map is None:
+        map = asyncore.socket_map
+    stats = {}
+    for obj in list(map.values()):
+        if isinstance(obj, dispatcher_with_sendq):
+            stats[repr(obj.addr)] = {
+                "queued_bytes": obj.queued_bytes,
+                "peak_queued_bytes": obj.peak_queued_bytes,
+                "reading_paused": obj.reading_paused,
+            }
+    return stats
@@ -0,0 +1,112 @@
+# coding: utf8
+# Python 3.8+
+# 帧编码方式，编号写在长度前缀的高8位（framing.pack_header）
+#   0 json    默认，兼容老客户端
+#   1 msgpack 需要 pip install msgpack
+#   2 pickle  protocol 5，大块 bytes/bytearray 走带外缓冲区，不拷进 pickle 流。
+#             pickle 可以执行任意代码，服务端默认不接受，只在可信网络里用 --allow-pickle 打开
+
+import json
+import pickle
+import struct
+
+JSON, MSGPACK, PICKLE = 0, 1, 2
+
+
+class JSONCodec(object):
+    id = JSON
+    name = "json"
+
+    def encode(self, obj):
+        return [json.dumps(obj).encode()]
+
+    def decode(self, body):
+        return json.loads(bytes(body))
+
+
+class MsgpackCodec(object):
+    id = MSGPACK
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+        self.msgpack = msgpack
+
+    def encode(self, obj):
+        return [self.msgpack.packb(obj, use_bin_type=True)]
+
+    def decode(self, body):
+        return self.msgpack.unpackb(body, raw=False)
+
+
+def _rebuild_blob(buf, kind):
+    return kind(buf)
+
+
+class _Blob(object):
+    # 包一层，让 pickler 把数据交给 buffer_callback
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        return _rebuild_blob, (pickle.PickleBuffer(self.data), type(self.data))
+
+
+class PickleCodec(object):
+    id = PICKLE
+    name = "pickle"
+    # 消息体: <I 带外缓冲区个数> <I pickle长度> <Q 每个缓冲区长度>... pickle 数据 缓冲区...
+    META = struct.Struct("<II")
+    SIZE = struct.Struct("<Q")
+
+    def __init__(self, oob_threshold=64 * 1024):
+        self.oob_threshold = oob_threshold
+
+    def wrap(self, obj):
+        if isinstance(obj, (bytes, bytearray)):
+            return _Blob(obj) if len(obj) >= self.oob_threshold else obj
+        if isinstance(obj, dict):
+            return {key: self.wrap(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.wrap(value) for value in obj)
+        return obj
+
+    def encode(self, obj):
+        buffers = []
+        data = pickle.dumps(self.wrap(obj), protocol=5, buffer_callback=buffers.append)
+        raws = [buf.raw() for buf in buffers]
+        meta = self.META.pack(len(raws), len(data)) + b"".join(self.SIZE.pack(raw.nbytes) for raw in raws)
+        return [meta, data] + raws
+
+    def decode(self, body):
+        view = memoryview(body)
+        count, length = self.META.unpack_from(view)
+        offset = self.META.size
+        sizes = [self.SIZE.unpack_from(view, offset + i * self.SIZE.size)[0] for i in range(count)]
+        offset += count * self.SIZE.size
+        data = view[offset:offset + length]
+        offset += length
+        buffers = []
+        for size in sizes:
+            buffers.append(view[offset:offset + size])
+            offset += size
+        return pickle.loads(data, buffers=buffers)
+
+
+CODECS = {JSON: JSONCodec(), PICKLE: PickleCodec()}
+try:
+    CODECS[MSGPACK] = MsgpackCodec()
+except ImportError:
+    pass
+
+NAMES = dict((codec.name, codec) for codec in CODECS.values())
+
+
+def get_codec(key):
+    # 按编号或名字取编码器
+    codec = CODECS.get(key) if isinstance(key, int) else NAMES.get(key)
+    if codec is None:
+        raise ValueError("codec not available: %r" % (key,))
+    return codec